@@ -0,0 +1,170 @@
+# Convert H-alpha excess (H-alpha minus r color) to accretion luminosity and mass accretion rate.
+# All the unit conversions are done once, at import, so the conversions below are plain NumPy
+# expressions that run on whole catalogs at once, with a radius and mass for every star.
+
+import numpy as np
+from astropy import units as u
+from astropy import constants as const
+from photometry import FILTERS, SPEED_OF_LIGHT_AA_PER_S
+
+# Absolute magnitude of the Sun in the SDSS_r band, from https://iopscience.iop.org/article/10.3847/1538-4365/aabfdf
+M_R_SUN = 4.53
+# Slope of log L_acc against log L_Ha, from Alcala+2017 table B.1, assuming log means log base 10
+# (they use ln elsewhere in their paper)
+L_ACC_SLOPE = 1.13
+
+def bandwidth_Hz(filter):
+    '''Bandwidth of a filter, converted from Angstrom as it was in the original astropy version
+    ((bandwidth*u.AA).to(u.Hz, equivalencies=u.spectral())).'''
+    return SPEED_OF_LIGHT_AA_PER_S/FILTERS[filter].bandwidth_AA
+
+# L_Ha (in L_sun) = L_HA_FACTOR*10**(-0.4*(Ha - r)), for the VST r and H-alpha filters
+L_R = 10**(-(M_R_SUN-4.77)/2.5) # L_r estimate (in L_sun) from the absolute magnitude of the Sun in the SDSS r band
+L_HA_FACTOR = (FILTERS['VST_Ha'].zero_point_Jy/FILTERS['VST_r'].zero_point_Jy)*L_R*(bandwidth_Hz('VST_r')/bandwidth_Hz('VST_Ha'))
+LOG_L_HA_FACTOR = np.log10(L_HA_FACTOR)
+
+# The r-band luminosity of a star relative to the Sun's, taken as a blackbody of its Teff and
+# radius at the VST r wavelength: (R_star/R_sun)**2*B(r, Teff)/B(r, T_sun)
+T_SUN = 5772.
+R_BAND_HC_OVER_KT = (const.h*const.c/(const.k_B*FILTERS['VST_r'].wavelength_AA*u.AA)).to(u.K).value
+
+def log_r_luminosity(teff, R_star=1.):
+    '''log10 of a star's r-band luminosity in units of the Sun's, for Teff (K) and R_star (R_sun).'''
+    teff = np.asarray(teff, dtype=np.float64)
+    return (2*np.log10(np.asarray(R_star, dtype=np.float64))
+            + np.log10(np.expm1(R_BAND_HC_OVER_KT/T_SUN)/np.expm1(R_BAND_HC_OVER_KT/teff)))
+
+# Mdot (in M_sun/yr) = MDOT_FACTOR*L_acc*R_star/M_star, with L_acc in L_sun, R_star in R_sun and M_star in M_sun
+MDOT_FACTOR = (1.25*const.L_sun*const.R_sun/(const.G*const.M_sun)).to(u.Msun/u.yr).value
+LOG_MDOT_FACTOR = np.log10(MDOT_FACTOR)
+
+def log_L_acc(Ha_minus_r_mag, log_L_r=0.):
+    '''log10 of the accretion luminosity (in L_sun) for an H-alpha minus r color, of a star
+    whose r-band luminosity is 10**log_L_r times the Sun's (see log_r_luminosity).'''
+    return L_ACC_SLOPE*(LOG_L_HA_FACTOR + log_L_r - 0.4*np.asarray(Ha_minus_r_mag, dtype=np.float64))
+
+def log_mdot(Ha_minus_r_mag, R_star=1., M_star=1., log_L_r=0.):
+    '''log10 of the mass accretion rate (in M_sun/yr) for an H-alpha minus r color.
+    R_star (in R_sun), M_star (in M_sun) and log_L_r (see log_L_acc) are scalars or arrays
+    with one value per star.'''
+    return LOG_MDOT_FACTOR + log_L_acc(Ha_minus_r_mag, log_L_r) + np.log10(np.asarray(R_star, dtype=np.float64)/M_star)
+
+def convert_mag_to_mdot(Ha_minus_r_mag, R_star=1., M_star=1.):
+    '''Convert from H-alpha minus r color (H-alpha excess) to mass accretion rate (in M_sun/yr).
+    R_star (in R_sun) and M_star (in M_sun) default to solar values.'''
+    return 10**log_mdot(Ha_minus_r_mag, R_star, M_star)
+
+# Lookup grid of L_acc and Mdot over (H-alpha minus r color, Teff), calibrated with the stellar
+# parameters of Alcala+2017 (see join_alcala_sptype.py). Build it once with
+# AccretionGrid.build('alcala_full_spec_sptype.csv').save(ACCRETION_GRID), then look up any
+# number of sources with AccretionGrid.load(ACCRETION_GRID).query(Ha_minus_r, teff=...).
+ACCRETION_GRID = 'accretion_grid.npz'
+SPECTRAL_CLASSES = 'OBAFGKM'
+
+def spectral_type_to_number(sptypes):
+    '''Convert spectral types such as "K7" or "M5.5" to numbers (O0 = 0, ..., K7 = 57, M5.5 = 65.5).
+    Types that cannot be parsed give NaN.'''
+    import pandas as pd
+    parts = pd.Series(np.asarray(sptypes, dtype=str).ravel()).str.extract(r'^\s*([OBAFGKM])(\d+(?:\.\d+)?)?')
+    classes = parts[0].map({c: 10.*i for i, c in enumerate(SPECTRAL_CLASSES)}).to_numpy(dtype=np.float64)
+    subclasses = pd.to_numeric(parts[1]).fillna(0).to_numpy(dtype=np.float64)
+    return (classes + subclasses).reshape(np.shape(sptypes))
+
+def read_calibration(filename, teff_col='Teff', radius_col='R_', mass_cols=('M__B15_', 'M__B98_'), sptype_col='SpType'):
+    '''Read the Teff, spectral type, radius (R_sun) and mass (M_sun) of the calibration stars.
+    The mass is taken from the first of mass_cols that has a value.'''
+    import pandas as pd
+    df = pd.read_csv(filename).drop_duplicates('Object')
+    mass = df[mass_cols[0]]
+    for col in mass_cols[1:]:
+        mass = mass.fillna(df[col])
+    return {'teff': df[teff_col].to_numpy(dtype=np.float64), 'sptype': spectral_type_to_number(df[sptype_col].fillna('')),
+            'radius': df[radius_col].to_numpy(dtype=np.float64), 'mass': mass.to_numpy(dtype=np.float64)}
+
+def fit_log_relation(x, y, deg=2):
+    '''Polynomial fit of log10(y) against x, ignoring missing values.'''
+    good = np.isfinite(x) & np.isfinite(y) & (y > 0)
+    return np.polyfit(x[good], np.log10(y[good]), deg)
+
+class AccretionGrid:
+    '''log10 L_acc (L_sun) and log10 Mdot (M_sun/yr) tabulated over H-alpha minus r color and Teff.
+    R_star and M_star at each Teff come from polynomial fits to the calibration stars, and
+    L_acc scales with the r-band luminosity of a star of that Teff and R_star. Spectral types
+    are converted to Teff by interpolating over the calibration stars.'''
+
+    def __init__(self, colors, teffs, log_L_acc, log_mdot, sptype_numbers, sptype_teffs):
+        self.colors = colors
+        self.teffs = teffs
+        self.log_L_acc = log_L_acc
+        self.log_mdot = log_mdot
+        self.sptype_numbers = sptype_numbers
+        self.sptype_teffs = sptype_teffs
+
+    @classmethod
+    def build(cls, calibration, color_range=(-4., 1.), n_colors=501, n_teffs=101, deg=2):
+        '''Build the grid from a calibration file (e.g. alcala_full_spec_sptype.csv). The Teff
+        axis spans the calibration stars; sources outside it get NaN.'''
+        cal = read_calibration(calibration)
+        teffs = np.linspace(np.nanmin(cal['teff']), np.nanmax(cal['teff']), n_teffs)
+        colors = np.linspace(color_range[0], color_range[1], n_colors)
+        R_star = 10**np.polyval(fit_log_relation(cal['teff'], cal['radius'], deg), teffs)
+        M_star = 10**np.polyval(fit_log_relation(cal['teff'], cal['mass'], deg), teffs)
+        log_L_r = log_r_luminosity(teffs, R_star)
+        log_L = log_L_acc(colors[:, None], log_L_r[None, :])
+        log_M = log_mdot(colors[:, None], R_star[None, :], M_star[None, :], log_L_r[None, :])
+        # Median Teff of each spectral type, for converting spectral types to Teff
+        good = np.isfinite(cal['sptype']) & np.isfinite(cal['teff'])
+        sptype_numbers = np.unique(cal['sptype'][good])
+        sptype_teffs = np.array([np.median(cal['teff'][good][cal['sptype'][good] == n]) for n in sptype_numbers])
+        return cls(colors, teffs, log_L, log_M, sptype_numbers, sptype_teffs)
+
+    def save(self, filename=ACCRETION_GRID):
+        np.savez(filename, colors=self.colors, teffs=self.teffs, log_L_acc=self.log_L_acc, log_mdot=self.log_mdot,
+                 sptype_numbers=self.sptype_numbers, sptype_teffs=self.sptype_teffs)
+
+    @classmethod
+    def load(cls, filename=ACCRETION_GRID, calibration=None):
+        '''Load a saved grid; if the file does not exist and a calibration file is given, build
+        the grid and save it first.'''
+        import os
+        if not os.path.exists(filename) and calibration is not None:
+            grid = cls.build(calibration)
+            grid.save(filename)
+            return grid
+        with np.load(filename) as data:
+            return cls(*[data[key] for key in ['colors', 'teffs', 'log_L_acc', 'log_mdot', 'sptype_numbers', 'sptype_teffs']])
+
+    def sptype_to_teff(self, sptypes):
+        '''Teff for spectral types (strings, or numbers from spectral_type_to_number).'''
+        numbers = np.asarray(sptypes)
+        if numbers.dtype.kind in 'USO':
+            numbers = spectral_type_to_number(numbers)
+        teff = np.interp(numbers, self.sptype_numbers, self.sptype_teffs)
+        outside = ~((numbers >= self.sptype_numbers[0]) & (numbers <= self.sptype_numbers[-1]))
+        return np.where(outside, np.nan, teff)
+
+    def interpolate(self, values, Ha_minus_r_mag, teff):
+        '''Bilinear interpolation of a grid of values; points off the grid give NaN.'''
+        x = np.asarray(Ha_minus_r_mag, dtype=np.float64)
+        y = np.asarray(teff, dtype=np.float64)
+        # Fractional grid indices (the axes are evenly spaced)
+        fx = (x - self.colors[0])/(self.colors[1] - self.colors[0])
+        fy = (y - self.teffs[0])/(self.teffs[1] - self.teffs[0])
+        inside = (fx >= 0) & (fx <= len(self.colors)-1) & (fy >= 0) & (fy <= len(self.teffs)-1)
+        fx = np.where(inside, fx, 0)
+        fy = np.where(inside, fy, 0)
+        i = np.minimum(fx.astype(np.intp), len(self.colors)-2)
+        j = np.minimum(fy.astype(np.intp), len(self.teffs)-2)
+        tx = fx - i
+        ty = fy - j
+        result = ((1-tx)*(1-ty)*values[i, j] + tx*(1-ty)*values[i+1, j]
+                  + (1-tx)*ty*values[i, j+1] + tx*ty*values[i+1, j+1])
+        return np.where(inside, result, np.nan)
+
+    def query(self, Ha_minus_r_mag, teff=None, sptype=None):
+        '''Return (log10 L_acc, log10 Mdot) for sources with the given H-alpha minus r colors
+        and either Teff or spectral types.'''
+        if teff is None:
+            teff = self.sptype_to_teff(sptype)
+        return (self.interpolate(self.log_L_acc, Ha_minus_r_mag, teff),
+                self.interpolate(self.log_mdot, Ha_minus_r_mag, teff))
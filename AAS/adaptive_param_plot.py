@@ -4,6 +4,7 @@
 import matplotlib as mpl
 import pylab as pl
 import numpy as np
+from run_report import instrumented
 
 def multidigitize(x,y,binsx,binsy):
     dx = np.digitize(x.flat, binsx)
@@ -13,6 +14,179 @@ def multidigitize(x,y,binsx,binsy):
 def linlogspace(xmin,xmax,n):
     return np.logspace(np.log10(xmin),np.log10(xmax),n)
 
+def bin_edges(v,bins):
+    """
+    Bin edges for one axis: an array of edges is used as is, while a number of
+    bins spans the range of the data, as in np.histogram2d
+    """
+    if not np.isscalar(bins):
+        return np.asarray(bins,dtype='float')
+    if v.size == 0:
+        vmin,vmax = 0.,1.
+    else:
+        vmin,vmax = v.min(),v.max()
+    if vmin == vmax:
+        vmin,vmax = vmin-0.5,vmax+0.5
+    return np.linspace(vmin,vmax,int(bins)+1)
+
+def split_bins(bins):
+    """
+    Split a bins argument into one entry per axis, following np.histogram2d:
+    an int or an array of edges applies to both axes, while a length-2 sequence
+    ([nx,ny] or [edgesx,edgesy]) gives one entry per axis
+    """
+    if np.isscalar(bins):
+        return bins,bins
+    if len(bins) == 2:
+        return bins[0],bins[1]
+    return bins,bins
+
+def digitize_edges(v,edges):
+    """
+    Bin index of each value: 1..nbins inside the edges, 0 below the first edge
+    and nbins+1 above the last one (the last edge itself is inside, as in
+    np.histogram2d)
+    """
+    d = np.searchsorted(edges,v,side='right')
+    d[v == edges[-1]] = len(edges)-1
+    return d
+
+def bin_points(x,y,bins=10):
+    """
+    Bin points in a single pass.  Returns the 2D histogram H (as from
+    np.histogram2d), the bin edges bx and by, and the bin index of every point
+    along each axis: 1..nbins inside the histogram, 0 below the first edge and
+    nbins+1 above the last one (the last edge itself is inside, as in
+    np.histogram2d).  x and y must be finite.
+    """
+    binsx,binsy = split_bins(bins)
+    bx,by = bin_edges(x,binsx),bin_edges(y,binsy)
+    nbinsx,nbinsy = len(bx)-1,len(by)-1
+    dx,dy = digitize_edges(x,bx),digitize_edges(y,by)
+    # One bincount over the grid padded with the out-of-range bins
+    counts = np.bincount(dx*(nbinsy+2)+dy,minlength=(nbinsx+2)*(nbinsy+2))
+    H = counts.reshape(nbinsx+2,nbinsy+2)[1:-1,1:-1].astype('float')
+    return H,bx,by,dx,dy
+
+def refine_edges(edges,subsample):
+    """
+    Split every bin into subsample equal bins
+    """
+    edges = np.asarray(edges,dtype='float')
+    fine = edges[:-1,None] + np.diff(edges)[:,None]*np.arange(subsample)/subsample
+    return np.append(fine.ravel(),edges[-1])
+
+class HistogramAccumulator(object):
+    """
+    A 2D histogram with fixed bin edges that is filled chunk by chunk, so that
+    data that do not fit in memory can be histogrammed.  Accumulators with the
+    same edges can be merged (e.g. one per process or per file, after saving
+    them with save and reading them back with load), and one can be passed
+    to adaptive_param_plot in place of x (with y=None).
+
+    Besides the counts, it keeps a raster "subsample" times finer than the
+    bins, from which adaptive_param_plot draws the points in bins below the
+    threshold.  Points outside of the bin edges are counted, but not drawn.
+    """
+    def __init__(self,bx,by,subsample=8):
+        self.bx = np.asarray(bx,dtype='float')
+        self.by = np.asarray(by,dtype='float')
+        self.subsample = subsample
+        self.px = refine_edges(self.bx,subsample)
+        self.py = refine_edges(self.by,subsample)
+        # includes the out-of-range bins, as in adaptive_param_plot's "plottable"
+        self.counts = np.zeros([len(self.bx)+1,len(self.by)+1],dtype='int64')
+        self.pixels = np.zeros([len(self.px)-1,len(self.py)-1],dtype='int64')
+
+    def update(self,x,y):
+        """
+        Add a chunk of points
+        """
+        x,y = np.asarray(x),np.asarray(y)
+        ok = np.isfinite(x) & np.isfinite(y)
+        x,y = x[ok],y[ok]
+        nx,ny = self.counts.shape
+        dx,dy = digitize_edges(x,self.bx),digitize_edges(y,self.by)
+        self.counts += np.bincount(dx*ny+dy,minlength=nx*ny).reshape(nx,ny)
+        npx,npy = self.pixels.shape
+        dx,dy = digitize_edges(x,self.px)-1,digitize_edges(y,self.py)-1
+        inside = (dx >= 0) & (dx < npx) & (dy >= 0) & (dy < npy)
+        self.pixels += np.bincount(dx[inside]*npy+dy[inside],minlength=npx*npy).reshape(npx,npy)
+        return self
+
+    def merge(self,other):
+        """
+        Add the counts of another accumulator with the same edges
+        """
+        if not (np.array_equal(self.bx,other.bx) and np.array_equal(self.by,other.by)
+                and self.subsample == other.subsample):
+            raise ValueError("Can only merge accumulators with the same bins")
+        self.counts += other.counts
+        self.pixels += other.pixels
+        return self
+
+    def histogram(self):
+        """
+        The 2D histogram, as from np.histogram2d
+        """
+        return self.counts[1:-1,1:-1].astype('float')
+
+    def save(self,filename):
+        np.savez(filename,bx=self.bx,by=self.by,subsample=self.subsample,
+                 counts=self.counts,pixels=self.pixels)
+
+    @classmethod
+    def load(cls,filename):
+        data = np.load(filename)
+        acc = cls(data['bx'],data['by'],subsample=int(data['subsample']))
+        acc.counts += data['counts']
+        acc.pixels += data['pixels']
+        return acc
+
+def axis_pixels(axis):
+    """
+    Size (x,y) of an axis in display pixels at the figure dpi
+    """
+    bbox = axis.get_window_extent()
+    return max(int(np.ceil(bbox.width)),1),max(int(np.ceil(bbox.height)),1)
+
+def marker_pixels(axis,marker,markersize=None):
+    """
+    Diameter in display pixels of a marker drawn with axis.plot
+    """
+    if markersize is None:
+        markersize = mpl.rcParams['lines.markersize']
+    # the point markers are drawn at half (",": one pixel) of the markersize
+    points = {'.':0.5*markersize,',':72./axis.figure.dpi}.get(marker,markersize)
+    return points*axis.figure.dpi/72.
+
+def draw_raster(axis,P,px,py,marker_color,footprint=None,**kwargs):
+    """
+    Draw every pixel of P holding at least one point in the marker color.
+    If footprint (a diameter in display pixels) is given, each occupied pixel
+    is grown to that size, so that isolated points stay as visible as
+    markers when the image is resampled to the output resolution
+    """
+    occupied = P > 0
+    if footprint is not None:
+        width,height = axis_pixels(axis)
+        # half the footprint, in image pixels
+        rx = footprint/2.*occupied.shape[0]/width
+        ry = footprint/2.*occupied.shape[1]/height
+        if rx >= 0.5 or ry >= 0.5:
+            from scipy.ndimage import binary_dilation
+            ix = np.arange(-int(np.ceil(rx)),int(np.ceil(rx))+1)
+            iy = np.arange(-int(np.ceil(ry)),int(np.ceil(ry))+1)
+            disk = (ix[:,None]/max(rx,0.5))**2 + (iy[None,:]/max(ry,0.5))**2 <= 1
+            occupied = binary_dilation(occupied,structure=disk)
+    rgba = np.zeros(P.T.shape+(4,))
+    rgba[...,:3] = mpl.colors.to_rgb(marker_color if marker_color is not None else 'k')
+    rgba[...,3] = occupied.T*kwargs.get('alpha',1)
+    axis.imshow(rgba,origin='lower',extent=[px[0],px[-1],py[0],py[-1]],
+                aspect='auto',interpolation='nearest',
+                zorder=kwargs.get('zorder',1))
+
+@instrumented(count_out=False)
 def adaptive_param_plot(x,y,
                         bins=10,
                         threshold=5,
@@ -29,6 +203,10 @@ def adaptive_param_plot(x,y,
                         cmap=None,
                         colors=None,
                         percentilelevels=None,
+                        binned=None,
+                        raster=False,
+                        raster_shape=None,
+                        raster_extent=None,
                         **kwargs):
     """
     Plot contours where the density of data points to be plotted is too high
@@ -36,9 +214,14 @@ def adaptive_param_plot(x,y,
     "contour" functions
     Parameters
     ----------
+    x,y: ndarray
+        The points to plot.  x may instead be a HistogramAccumulator (with
+        y=None), in which case bins are taken from it and the points below
+        the threshold are drawn from its raster
     bins: int or ndarray
-        The number of bins or a list of bins.  Passed to np.histogram2d; see
-        their docs for details
+        The number of bins or a list of bins, as for np.histogram2d; see
+        their docs for details.  Pass the same bin edges (e.g. from
+        bin_edges) to several calls to put different samples on one grid
     threshold: int
         The minimum number of points to replace a bin with a contour.  For
         npoints<=threshold, the individual points will be plotted
@@ -67,6 +250,20 @@ def adaptive_param_plot(x,y,
         A matplotlib axis to plot on
     cmap: matplotlib colormap
         A valid matplotlib color map
+    binned: None or tuple
+        Precomputed output of bin_points(x,y,bins) for the finite points of
+        x and y, to skip binning when the same points are plotted again
+    raster: bool
+        Draw the individual (below-threshold) points as a single image of
+        raster_shape pixels instead of one marker each, so that drawing time
+        and file size do not grow with the number of points.  Each point
+        covers the pixels its marker would
+    raster_shape: None or tuple
+        Number of pixels (x,y) of the image used when raster=True; defaults
+        to the size of the axis in display pixels
+    raster_extent: None or list
+        [xmin,xmax,ymin,ymax] covered by the image; defaults to the range of
+        the points.  Points outside of it are not drawn
     kwargs: dict
         Passed to plot, contour, AND colormesh, so must be valid for ALL 3!
     """
@@ -74,26 +271,23 @@ def adaptive_param_plot(x,y,
     if axis is None:
         axis = pl.gca()
 
-    ok = np.isfinite(x) * np.isfinite(y)
-
-    # set the number of bins to be an integer value, which can be extracted
-    # from an array-style bin set
-    if hasattr(bins,'ndim') and bins.ndim == 2:
-        # If you define the bins as an array, they define the BIN EDGES, so nbins=len(bins)-1
-        nbinsx,nbinsy = bins.shape[1]-1,bins.shape[1]-1
+    accumulator = x if isinstance(x,HistogramAccumulator) else None
+    if accumulator is not None:
+        H,bx,by = accumulator.histogram(),accumulator.bx,accumulator.by
     else:
-        try:
-            nbinsx = nbinsy = len(bins)-1
-        except TypeError:
-            nbinsx = nbinsy = bins
+        x,y = np.asarray(x),np.asarray(y)
+        ok = np.isfinite(x) & np.isfinite(y)
+        x,y = x[ok],y[ok]
 
-    H,bx,by = np.histogram2d(x[ok],y[ok],bins=bins)
-
-    # determine the locations of each pixel
-    dx,dy = multidigitize(x[ok],y[ok],bx,by)
+        # bin the points once, getting both the histogram and the bin of each point
+        if binned is None:
+            binned = bin_points(x,y,bins=bins)
+        H,bx,by,dx,dy = binned
+        H = H.copy()
+    nbinsx,nbinsy = H.shape
 
     # anything beyond the range of the histogram bins defaults to plottable=True
-    # need +1 because anything <bins.min() or >bins.max() is on the edges...
+    # need +2 because anything <bins.min() or >bins.max() is on the edges...
     plottable = np.ones([nbinsx+2,nbinsy+2], dtype='bool')
     # Need a cropped version of "plottable" to index H
     # This is a view on plottable, so should result in inplace modification...
@@ -107,7 +301,17 @@ def adaptive_param_plot(x,y,
     #H[plottable] = np.nan
     H[plottable_hist] = 0
     #H = np.ma.masked_where(plottable,H)
-    toplot = plottable[dx,dy]
+    if accumulator is not None:
+        # keep the raster pixels that fall in bins below the threshold
+        sub = accumulator.subsample
+        pixel_plottable = np.repeat(np.repeat(plottable_hist,sub,axis=0),sub,axis=1)
+        P = np.where(pixel_plottable,accumulator.pixels,0)
+        ix,iy = np.nonzero(P)
+        x_toplot = (accumulator.px[ix]+accumulator.px[ix+1])/2.
+        y_toplot = (accumulator.py[iy]+accumulator.py[iy+1])/2.
+    else:
+        toplot = plottable[dx,dy]
+        x_toplot,y_toplot = x[toplot],y[toplot]
 
     cx = (bx[1:]+bx[:-1])/2.
     cy = (by[1:]+by[:-1])/2.
@@ -136,13 +340,34 @@ def adaptive_param_plot(x,y,
     if 'linestyle' in kwargs:
         kwargs.pop('linestyle')
 
-    if marker not in ('none', None):
-        axis.plot(x[ok][toplot],
-                  y[ok][toplot],
+    if marker not in ('none', None) and (raster or accumulator is not None):
+        footprint = marker_pixels(axis,marker,kwargs.get('markersize',kwargs.get('ms')))
+        if accumulator is not None:
+            draw_raster(axis,P,accumulator.px,accumulator.py,marker_color,footprint=footprint,**kwargs)
+        elif x_toplot.size > 0:
+            if raster_shape is None:
+                raster_shape = axis_pixels(axis)
+            if raster_extent is None:
+                raster_bins = raster_shape
+            else:
+                raster_bins = [np.linspace(raster_extent[0],raster_extent[1],raster_shape[0]+1),
+                               np.linspace(raster_extent[2],raster_extent[3],raster_shape[1]+1)]
+            P,px,py,_,_ = bin_points(x_toplot,y_toplot,bins=raster_bins)
+            draw_raster(axis,P,px,py,marker_color,footprint=footprint,**kwargs)
+        # an empty line, so that the legend still gets an entry
+        axis.plot([],[],
+                  linestyle='none',
+                  marker=marker,
+                  markerfacecolor=marker_color,
+                  markeredgecolor=marker_color,
+                  **kwargs)
+    elif marker not in ('none', None):
+        axis.plot(x_toplot,
+                  y_toplot,
                   linestyle='none',
                   marker=marker,
                   markerfacecolor=marker_color,
                   markeredgecolor=marker_color,
                   **kwargs)
 
-    return cx,cy,H,x[ok][toplot],y[ok][toplot]
\ No newline at end of file
+    return cx,cy,H,x_toplot,y_toplot
\ No newline at end of file
@@ -0,0 +1,89 @@
+# Read ESO Phase 3 catalog products (ADP.*.fits, e.g. VPHAS tiles from the ESO archive) without
+# loading them into memory. The binary table extensions are memory-mapped, only the requested
+# columns are touched, and rows are handed out in blocks that are views onto the file.
+# The blocks can be appended straight into a catalog store (see catalog_store.py).
+
+import numpy as np
+import pandas as pd
+from astropy.io import fits
+from catalog_store import append_to_store
+
+# UCDs that ESO Phase 3 catalogs put on their main RA and dec columns
+RA_UCD = 'pos.eq.ra;meta.main'
+DEC_UCD = 'pos.eq.dec;meta.main'
+
+def open_adp(filename):
+    '''Open an ADP file with its data memory-mapped.'''
+    return fits.open(filename, memmap=True)
+
+def catalog_hdus(hdul):
+    '''Indices of the binary table extensions of an open file.'''
+    return [i for i, hdu in enumerate(hdul) if isinstance(hdu, fits.BinTableHDU)]
+
+def find_column(hdu, ucd):
+    '''Name of the column of a table extension with the given UCD (TUCDn keyword), or None.'''
+    for i, name in enumerate(hdu.columns.names):
+        if hdu.header.get('TUCD{:d}'.format(i+1), '').strip() == ucd:
+            return name
+    return None
+
+def radec_columns(hdu, ra_col=None, dec_col=None):
+    '''RA and dec column names of a table extension, taken from the UCDs unless given.'''
+    ra_col = ra_col or find_column(hdu, RA_UCD)
+    dec_col = dec_col or find_column(hdu, DEC_UCD)
+    if ra_col is None or dec_col is None:
+        raise KeyError("Could not find the RA/dec columns of {} (no {} / {} UCDs); pass ra_col and dec_col".format(hdu.name, RA_UCD, DEC_UCD))
+    return ra_col, dec_col
+
+def iter_blocks(filename, columns=None, hdus=None, block_size=1000000):
+    '''Yield (hdu index, dict of column -> array) for consecutive blocks of block_size rows of
+    the given table extensions (all of them if None), reading only the requested columns.
+    Unscaled columns are views onto the memory-mapped file (in its big-endian byte order),
+    so a block costs no memory until its values are used.'''
+    with open_adp(filename) as hdul:
+        for i in (catalog_hdus(hdul) if hdus is None else hdus):
+            hdu = hdul[i]
+            data = hdu.data
+            if data is None or len(data) == 0:
+                continue
+            names = hdu.columns.names if columns is None else columns
+            fields = {name: data.field(name) for name in names}
+            for start in range(0, len(data), block_size):
+                yield i, {name: field[start:start+block_size] for name, field in fields.items()}
+
+def block_to_dataframe(block):
+    '''Convert a block to a pandas dataframe in native byte order. Vector-valued columns
+    (e.g. aperture magnitudes) are expanded into one column per element, name_0, name_1, ...;
+    columns of more than one dimension per row raise ValueError.'''
+    columns = {}
+    for name, values in block.items():
+        values = np.asarray(values, dtype=values.dtype.newbyteorder('='))
+        if values.ndim == 1:
+            columns[name] = values
+        elif values.ndim == 2:
+            for j in range(values.shape[1]):
+                columns['{}_{:d}'.format(name, j)] = values[:, j]
+        else:
+            raise ValueError("Column {} has shape {} per row; only scalar and vector columns can be converted".format(name, values.shape[1:]))
+    return pd.DataFrame(columns)
+
+def read_columns(filename, columns, hdus=None):
+    '''Read the given columns of the table extensions (all of them if None) into one dataframe.'''
+    frames = [block_to_dataframe(block) for _, block in iter_blocks(filename, columns, hdus)]
+    if len(frames) == 0:
+        return pd.DataFrame({col: pd.Series(dtype=np.float64) for col in columns})
+    return pd.concat(frames, ignore_index=True)
+
+def ingest_adp(filename, store_path, columns=None, hdus=None, block_size=1000000, nside=64, ra_col=None, dec_col=None):
+    '''Append the table extensions of an ADP file to a catalog store, block_size rows at a time.
+    The RA and dec columns are found from their UCDs unless given, and are always included.
+    Returns the number of rows written.'''
+    with open_adp(filename) as hdul:
+        hdus = catalog_hdus(hdul) if hdus is None else hdus
+        ra_col, dec_col = radec_columns(hdul[hdus[0]], ra_col, dec_col)
+    if columns is not None:
+        columns = list(dict.fromkeys([ra_col, dec_col] + list(columns)))
+    nrows = 0
+    for i, block in iter_blocks(filename, columns, hdus, block_size):
+        nrows += append_to_store(store_path, block_to_dataframe(block), nside=nside, ra_col=ra_col, dec_col=dec_col)
+    return nrows
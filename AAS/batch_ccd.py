@@ -0,0 +1,105 @@
+# Render a batch of color-color diagrams, headless and in parallel, from a JSON file of figure
+# specs (see ccd_figures.json). Each worker process loads every sample once and reuses it for
+# all the figures it draws, so a full set of figures is regenerated in one run:
+#     python batch_ccd.py ccd_figures.json --workers 4
+# With --report, the time and memory of each stage in every worker go into one run report
+# (see run_report.py).
+
+import json
+import argparse
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
+from adaptive_param_plot import *
+from catalog_loader import import_csv, Cut
+from colors import evaluate_colors, color_label
+import run_report
+from run_report import stage
+
+# Samples loaded by this worker process, and their cached magnitudes
+SAMPLE_SPECS = {}
+SAMPLES = {}
+MAG_CACHES = {}
+
+def init_worker(sample_specs):
+    '''Remember the sample definitions; samples are loaded the first time a figure needs them.'''
+    SAMPLE_SPECS.update(sample_specs)
+
+def get_sample(name):
+    '''Return a loaded sample. A sample is read from a file ("file", "columns", "sourceName",
+    and optionally "keep", "chunksize", "cuts", a list of [column, op, value] quality cuts
+    (see import_csv for when they apply), and "how", the de-duplication of sources with
+    several rows), or
+    derived from another one ("base"), and may be cut with a pandas query string ("query").'''
+    if name not in SAMPLES:
+        spec = SAMPLE_SPECS[name]
+        if 'base' in spec:
+            df = get_sample(spec['base'])
+        else:
+            df = import_csv(spec['file'], columns=spec['columns'], sourceName=spec['sourceName'], keep=spec.get('keep', []), chunksize=spec.get('chunksize'),
+                            cuts=[Cut(*cut) for cut in spec.get('cuts', [])], how=spec.get('how', 'mean'))
+        if 'query' in spec:
+            with stage('query', rows_in=len(df)) as record:
+                df = df.query(spec['query'])
+                record['rows_out'] = len(df)
+        SAMPLES[name] = df
+        MAG_CACHES[name] = {}
+    return SAMPLES[name]
+
+def render_figure(fig_spec):
+    '''Draw one figure spec and save it; returns the output filename.'''
+    fig, ax = plt.subplots(dpi=fig_spec.get('dpi', 100))
+    ax.grid(zorder=11)
+    for layer in fig_spec['layers']:
+        df = get_sample(layer['sample'])
+        colors = evaluate_colors(df, [fig_spec['x'], fig_spec['y']], MAG_CACHES[layer['sample']])
+        adaptive_param_plot(colors[fig_spec['x']], colors[fig_spec['y']], axis=ax,
+                            bins=layer.get('bins', fig_spec.get('bins', 20)),
+                            threshold=layer.get('threshold', 10),
+                            marker=layer.get('marker', '.'),
+                            marker_color=layer['color'], colors=layer['color'],
+                            fill=False, alpha=1, cmap=None,
+                            raster=fig_spec.get('raster', False),
+                            label=layer.get('label', layer['sample']),
+                            zorder=layer.get('zorder', 2))
+    ax.set_xlabel(fig_spec.get('xlabel', color_label(fig_spec['x'])))
+    ax.set_ylabel(fig_spec.get('ylabel', color_label(fig_spec['y'])))
+    if 'xlim' in fig_spec:
+        ax.set_xlim(fig_spec['xlim'])
+    if 'ylim' in fig_spec:
+        ax.set_ylim(fig_spec['ylim'])
+    if 'title' in fig_spec:
+        ax.set_title(fig_spec['title'])
+    ax.legend()
+    fig.tight_layout()
+    with stage('savefig'):
+        fig.savefig(fig_spec['output'], dpi=fig_spec.get('save_dpi', 250), facecolor='w', edgecolor='w')
+    plt.close(fig)
+    return fig_spec['output']
+
+def render_and_report(fig_spec):
+    '''Render one figure in a worker, handing back the stages it recorded.'''
+    with stage('render_figure') as record:
+        record['output'] = output = render_figure(fig_spec)
+    return output, run_report.take()
+
+def render_all(specs, workers=4):
+    '''Render every figure in a spec dict ({"samples": {...}, "figures": [...]}) across a
+    pool of worker processes.'''
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(specs['samples'],)) as pool:
+        for output, records in pool.map(render_and_report, specs['figures']):
+            run_report.add(records)
+            print("Saved", output)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Render color-color diagrams from a JSON file of figure specs.")
+    parser.add_argument('specs', help="JSON file with 'samples' and 'figures'")
+    parser.add_argument('--workers', type=int, default=4, help="number of worker processes")
+    parser.add_argument('--report', help="write a JSON run report (timings, memory, rows per stage) to this file or directory")
+    args = parser.parse_args()
+    if args.report:
+        run_report.enable(args.report)
+    with open(args.specs) as f:
+        specs = json.load(f)
+    render_all(specs, workers=args.workers)
@@ -0,0 +1,201 @@
+# Benchmarks of the hot paths (loading and de-duplicating cross-match outputs, flux to
+# magnitude conversion, cross-matching and the contour plots) on synthetic catalogs:
+#     python benchmarks.py --sizes 1e3 1e4 1e5 1e6 --save-baseline baseline.json
+#     python benchmarks.py --sizes 1e3 1e4 1e5 1e6 --compare baseline.json
+# Each case runs at each size in a fresh process, so that its peak RSS is its own. The time
+# is the best of --repeat runs (wall and CPU). The memory is the peak allocated by the stage
+# itself (traced in one more run, which misses Arrow's own buffers), how much the stage raised
+# the peak RSS of the process above that after the setup (which does count them), and the
+# peak RSS itself. The synthetic catalogs (see synthetic_catalogs.py) are written once to
+# --data-dir, in chunks, and every case reads its data back from them (through the Feather
+# sidecars, as the scripts do), so no case holds a whole generated catalog in memory. Comparing against a baseline exits with status 1 if a case got
+# slower or used more memory than the tolerance.
+
+import os
+import io
+import gc
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+import multiprocessing
+import numpy as np
+from run_report import peak_rss_mb
+
+DATA_DIR = 'bench_data'
+SIZES = [1e3, 1e4, 1e5, 1e6]
+COLUMNS = ['mag3_6', 'mag4_5', 'rmag', 'Hamag', 'imag']
+
+def dataset(data_dir, kind, n):
+    '''Path of a synthetic catalog of n rows, written first if it is not there yet.'''
+    from synthetic_catalogs import write_catalog
+    os.makedirs(data_dir, exist_ok=True)
+    filename = os.path.join(data_dir, '{}_{}.csv'.format(kind, int(n)))
+    if not os.path.exists(filename):
+        write_catalog(kind, n, filename + '.tmp.csv')
+        os.replace(filename + '.tmp.csv', filename)
+    return filename
+
+# Each case takes a size and the data directory, does its setup and returns the stage to time
+def load_cold(n, data_dir):
+    '''Loading a cross-match output whose Feather sidecar has to be written first.'''
+    from catalog_loader import load_catalog, sidecar_path
+    filename = dataset(data_dir, 'xmatch_spicy_vphas', n)
+    def run():
+        if os.path.exists(sidecar_path(filename)):
+            os.remove(sidecar_path(filename))
+        load_catalog(filename)
+    return run
+
+def import_csv_case(how):
+    def case(n, data_dir):
+        from catalog_loader import import_csv, write_sidecar
+        filename = dataset(data_dir, 'xmatch_spicy_vphas', n)
+        write_sidecar(filename)
+        return lambda: import_csv(filename, COLUMNS, 'SPICY', keep=[], how=how)
+    case.__doc__ = "import_csv(how='{}') of a cross-match output, from its sidecar.".format(how)
+    return case
+
+def fluxes_to_mags_case(n, data_dir):
+    '''Converting all the c2d fluxes, read from the catalog's sidecar, to magnitudes.'''
+    from catalog_loader import load_columns
+    from photometry import fluxes_to_mags
+    from synthetic_catalogs import C2D_BANDS
+    columns = load_columns(dataset(data_dir, 'c2d', n), [band[0] for band in C2D_BANDS])
+    fluxes = np.column_stack([columns[band[0]] for band in C2D_BANDS])
+    filters = [band[1] for band in C2D_BANDS]
+    return lambda: fluxes_to_mags(fluxes, filters)
+
+def match_indices_case(n, data_dir):
+    '''Cross-matching a tenth of the sources of a VPHAS-like catalog (moved by up to 0.5
+    arcsec) against all of it within 1 arcsec.'''
+    from catalog_loader import load_columns
+    from local_xmatch import match_indices
+    columns = load_columns(dataset(data_dir, 'vphas', n), ['RAJ2000', 'DEJ2000'])
+    ra2, dec2 = columns['RAJ2000'], columns['DEJ2000']
+    rng = np.random.default_rng(1)
+    pick = rng.choice(len(ra2), max(int(n)//10, 1), replace=False)
+    ra1 = ra2[pick] + rng.uniform(-0.5, 0.5, len(pick))/3600/np.cos(np.radians(dec2[pick]))
+    dec1 = dec2[pick] + rng.uniform(-0.5, 0.5, len(pick))/3600
+    return lambda: match_indices(ra1, dec1, ra2, dec2, 1.)
+
+def plot_case(raster):
+    def case(n, data_dir):
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        from adaptive_param_plot import adaptive_param_plot
+        from catalog_loader import load_columns
+        columns = load_columns(dataset(data_dir, 'vphas', n), ['rmag', 'Hamag', 'imag'])
+        x = columns['rmag'] - columns['imag']
+        y = columns['rmag'] - columns['Hamag']
+        ok = np.isfinite(x) & np.isfinite(y)
+        x, y = x[ok], y[ok]
+        def run():
+            fig, axis = plt.subplots()
+            adaptive_param_plot(x, y, bins=30, threshold=5, axis=axis, raster=raster)
+            fig.savefig(io.BytesIO(), format='png', dpi=100)
+            plt.close(fig)
+        return run
+    case.__doc__ = "adaptive_param_plot of an r-Ha vs r-i diagram{}, saved as PNG.".format(' (raster)' if raster else '')
+    return case
+
+CASES = {
+    'load_cold': load_cold,
+    'import_csv_mean': import_csv_case('mean'),
+    'import_csv_best': import_csv_case('best'),
+    'fluxes_to_mags': fluxes_to_mags_case,
+    'match_indices': match_indices_case,
+    'adaptive_param_plot': plot_case(False),
+    'adaptive_param_plot_raster': plot_case(True),
+}
+
+def run_case(name, n, data_dir, repeat):
+    '''Set up and time one case at one size (in the current process). Returns its results.'''
+    stage = CASES[name](n, data_dir)
+    gc.collect()
+    setup_rss = peak_rss_mb()
+    times, cpu_times = [], []
+    for _ in range(repeat):
+        gc.collect()
+        start, cpu_start = time.perf_counter(), time.process_time()
+        stage()
+        times.append(time.perf_counter() - start)
+        cpu_times.append(time.process_time() - cpu_start)
+    gc.collect()
+    tracemalloc.start()
+    stage()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'case': name, 'rows': int(n), 'time_s': min(times), 'cpu_s': min(cpu_times),
+            'peak_alloc_mb': peak/2**20, 'rss_growth_mb': peak_rss_mb() - setup_rss, 'max_rss_mb': peak_rss_mb()}
+
+def _run_case(task):
+    return run_case(*task)
+
+def run_benchmarks(cases, sizes, data_dir=DATA_DIR, repeat=3):
+    '''Run the given cases at the given sizes, each in a fresh process.'''
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for name in cases:
+        for n in sizes:
+            with context.Pool(1, maxtasksperchild=1) as pool:
+                result = pool.apply(_run_case, ((name, n, data_dir, repeat),))
+            print("{case:28s} {rows:>11d} rows  {time_s:9.4f} s  {cpu_s:9.4f} s CPU  "
+                  "{peak_alloc_mb:9.1f} MB allocated  {rss_growth_mb:9.1f} MB RSS growth  {max_rss_mb:9.1f} MB RSS".format(**result))
+            results.append(result)
+    return results
+
+def machine():
+    return {'platform': platform.platform(), 'python': platform.python_version(),
+            'numpy': np.__version__, 'cpus': os.cpu_count()}
+
+def save_baseline(filename, results):
+    with open(filename, 'w') as f:
+        json.dump({'machine': machine(), 'results': results}, f, indent=1)
+
+def compare(results, filename, tolerance=0.2, min_time=0.01, min_memory=10.):
+    '''Compare results with a saved baseline. A case regresses when its time, allocated
+    memory, RSS growth or peak RSS exceeds the baseline by more than the tolerance (a
+    fraction); times below min_time seconds and RSS below min_memory MB are too noisy to
+    compare. Returns the list of regressions.'''
+    with open(filename) as f:
+        baseline = json.load(f)
+    if baseline['machine'] != machine():
+        print("Warning: the baseline was recorded on a different machine:", baseline['machine'])
+    known = {(r['case'], r['rows']): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        old = known.get((result['case'], result['rows']))
+        if old is None:
+            continue
+        for key, floor in (('time_s', min_time), ('peak_alloc_mb', 1.), ('rss_growth_mb', min_memory), ('max_rss_mb', min_memory)):
+            # Baselines saved before RSS was compared lack rss_growth_mb
+            if key in old and result[key] > max(old[key], floor)*(1 + tolerance):
+                regressions.append("{} at {} rows: {} {:.4g} -> {:.4g}".format(result['case'], result['rows'], key, old[key], result[key]))
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the catalog hot paths on synthetic data.")
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), default=list(CASES))
+    parser.add_argument('--sizes', nargs='+', type=float, default=SIZES, help="numbers of rows, up to 1e8")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per case (the best is kept)")
+    parser.add_argument('--data-dir', default=DATA_DIR, help="where the synthetic catalogs are kept")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--save-baseline', help="save the results as a baseline")
+    parser.add_argument('--compare', help="compare the results with this baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed slowdown, as a fraction")
+    args = parser.parse_args()
+    results = run_benchmarks(args.cases, args.sizes, data_dir=args.data_dir, repeat=args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'machine': machine(), 'results': results}, f, indent=1)
+    if args.save_baseline:
+        save_baseline(args.save_baseline, results)
+    if args.compare:
+        regressions = compare(results, args.compare, tolerance=args.tolerance)
+        for regression in regressions:
+            print("REGRESSION:", regression)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,337 @@
+# Shared loader for the catalog .csv and .fits files (cross-match outputs, SPICY tables, ...).
+# The first time a file is read it is converted to an uncompressed Feather (Arrow IPC)
+# sidecar next to it, with the dtypes below already applied and no nulls in float columns;
+# later loads read only the requested columns from the sidecar through a memory map, and
+# numeric columns come back as views onto the mapped file rather than copies. Worker
+# processes loading the same catalog therefore share its pages. To convert catalogs ahead
+# of time:
+#     python catalog_loader.py SPICY/table1.csv SPICY/table2.fits
+# Quality cuts (e.g. magnitude errors below 0.1) are declared as a list of Cut predicates and
+# applied while the file is read, so rows that fail them are never loaded or grouped.
+
+import os
+import operator
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from pyarrow import csv, feather, fs
+from run_report import instrumented, stage, enabled
+
+# Explicit dtypes for columns that show up across our catalogs. Magnitudes and their errors
+# are only given to a few decimal places, so float32 loses nothing; fluxes and coordinates
+# keep float64. Source identifiers become categories, which are cheap to group by.
+DTYPES = {'SPICY': 'category', 'sourceID': 'category', 'Object': 'category'}
+for band in ['u', 'g', 'r', 'r2', 'i', 'Ha']:
+    DTYPES[band + 'mag'] = 'float32'
+    DTYPES['e_' + band + 'mag'] = 'float32'
+for band in ['3_6', '4_5', '5_8', '8_0', '24']:
+    DTYPES['mag' + band] = 'float32'
+    DTYPES['e_mag' + band] = 'float32'
+
+# A quality cut keeps the rows where "column op value" holds, e.g. Cut('e_Hamag', '<', 0.1);
+# op 'notnull' (value ignored) keeps the rows where column is not NaN. Rows with NaN in the
+# column fail every comparison, as they do in pandas.
+Cut = namedtuple('Cut', ['column', 'op', 'value'])
+
+CUT_OPS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge, '==': operator.eq, '!=': operator.ne}
+
+def max_error(columns, limit):
+    '''Cuts keeping the rows where every column in columns (e.g. magnitude errors) is below limit.'''
+    return [Cut(col, '<', limit) for col in columns]
+
+def not_null(columns):
+    '''Cuts keeping the rows where no column in columns is NaN.'''
+    return [Cut(col, 'notnull', None) for col in columns]
+
+def cut_columns(cuts):
+    '''Columns that a list of cuts needs.'''
+    return list(dict.fromkeys(cut.column for cut in cuts))
+
+def cuts_mask(df, cuts):
+    '''Evaluate a list of cuts over a dataframe as one combined boolean mask.'''
+    mask = np.ones(len(df), dtype=bool)
+    for cut in cuts:
+        if cut.op == 'notnull':
+            mask &= df[cut.column].notna().to_numpy()
+        else:
+            mask &= CUT_OPS[cut.op](df[cut.column], cut.value).to_numpy(dtype=bool, na_value=False)
+    return mask
+
+def cuts_expression(cuts, schema):
+    '''Combine a list of cuts into one Arrow filter expression, for filtering while reading
+    a table with the given schema.'''
+    expr = None
+    for cut in cuts:
+        field = pc.field(cut.column)
+        if cut.op == 'notnull':
+            term = field.is_valid()
+            # .csv files give nulls for empty values, but float columns may also hold NaN
+            if pa.types.is_floating(schema.field(cut.column).type):
+                term = term & ~pc.is_nan(field)
+        else:
+            term = CUT_OPS[cut.op](field, cut.value)
+        expr = term if expr is None else expr & term
+    return expr
+
+def sidecar_path(filename):
+    '''Feather file kept next to a catalog: table1.csv -> table1.feather, table2.fits -> table2_fits.feather.'''
+    root, ext = os.path.splitext(filename)
+    if ext == '.csv':
+        return root + '.feather'
+    return root + '_' + ext[1:] + '.feather'
+
+def read_source(filename):
+    '''Read a .csv file, or any table astropy can read (e.g. .fits), as an Arrow table.'''
+    if filename.endswith('.csv'):
+        # Empty strings are missing values, as they are for pandas
+        return csv.read_csv(filename, convert_options=csv.ConvertOptions(strings_can_be_null=True))
+    from astropy.table import Table
+    tbl = Table.read(filename)
+    tbl.convert_bytestring_to_unicode()
+    return pa.Table.from_pandas(tbl.to_pandas(), preserve_index=False)
+
+def columnar_table(tbl):
+    '''Apply DTYPES to an Arrow table, and fill the nulls of float columns with NaN, so that
+    those columns can be handed out without copying.'''
+    for i, name in enumerate(tbl.column_names):
+        col = tbl.column(i)
+        if DTYPES.get(name) == 'category':
+            col = col.dictionary_encode() if not pa.types.is_dictionary(col.type) else col
+        elif DTYPES.get(name) == 'float32':
+            col = col.cast(pa.float32())
+        if pa.types.is_floating(col.type) and col.null_count > 0:
+            col = pc.fill_null(col, np.nan)
+        tbl = tbl.set_column(i, name, col)
+    return tbl
+
+@instrumented()
+def write_sidecar(filename):
+    '''Convert a catalog to a Feather sidecar, unless an up-to-date one already exists.'''
+    sidecar = sidecar_path(filename)
+    if os.path.exists(sidecar) and os.path.getmtime(sidecar) >= os.path.getmtime(filename):
+        return sidecar
+    tbl = columnar_table(read_source(filename)).combine_chunks()
+    # Uncompressed, so that the sidecar can be memory-mapped rather than decompressed, and in
+    # one record batch, so that each column maps to one contiguous array (with the default
+    # 64K-row batches, to_numpy has to copy the chunks together); written under a name of this
+    # process's own, as worker processes may convert the same file at once
+    tmp = '{}.{}.tmp'.format(sidecar, os.getpid())
+    feather.write_feather(tbl, tmp, compression='uncompressed', chunksize=max(tbl.num_rows, 1))
+    os.replace(tmp, sidecar)
+    return sidecar
+
+def read_mapped(filename, columns=None):
+    '''Read the given columns (all of them if None) of a sidecar through a memory map. The
+    whole table is mapped and the columns selected afterwards, as asking the reader for a
+    subset of the columns copies them into memory.'''
+    tbl = feather.read_table(filename, memory_map=True)
+    return tbl if columns is None else tbl.select(columns)
+
+def load_columns(filename, columns=None):
+    '''Return a dict of column -> NumPy array for the given columns (all of them if None) of a
+    catalog. Numeric columns are read-only views onto the memory-mapped sidecar.'''
+    if not filename.endswith('.feather'):
+        filename = write_sidecar(filename)
+    tbl = read_mapped(filename, None if columns is None else list(dict.fromkeys(columns)))
+    return {name: tbl.column(name).to_numpy() for name in tbl.column_names}
+
+def column_dtypes(dtypes=None):
+    '''DTYPES, updated with any given in dtypes.'''
+    types = dict(DTYPES)
+    if dtypes is not None:
+        types.update(dtypes)
+    return types
+
+@instrumented()
+def load_catalog(filename, columns=None, dtypes=None, cuts=None):
+    '''Read the given columns (all of them if None) of a catalog into a pandas dataframe,
+    converting them to the dtypes in DTYPES, updated with any given in dtypes.
+    If a list of cuts is given, only the rows passing all of them are read.'''
+    if not filename.endswith('.feather'):
+        filename = write_sidecar(filename)
+    columns = None if columns is None else list(dict.fromkeys(columns))
+    if cuts:
+        # The filter is evaluated batch by batch over the memory-mapped file
+        dataset = ds.dataset(filename, format='feather', filesystem=fs.LocalFileSystem(use_mmap=True))
+        with stage('cuts') as record:
+            if enabled():
+                record['rows_in'] = dataset.count_rows()
+            tbl = dataset.to_table(columns=columns, filter=cuts_expression(cuts, dataset.schema))
+            record['rows_out'] = tbl.num_rows
+    else:
+        tbl = read_mapped(filename, columns)
+    # split_blocks keeps each column in its own block, so numeric columns are not copied
+    df = tbl.to_pandas(split_blocks=True)
+    types = {col: dtype for col, dtype in column_dtypes(dtypes).items() if col in df.columns and df[col].dtype != dtype}
+    if len(types) > 0:
+        df = df.astype(types)
+    return df
+
+def read_csv_chunks(filename, usecols=None, chunksize=1000000, dtypes=None):
+    '''Read a .csv file in chunks of chunksize rows, with the dtypes load_catalog gives (see
+    column_dtypes). Category columns are left as read, as every chunk would get categories of
+    its own; the streamed results are indexed by category at the end (see categorize_index).'''
+    types = {col: dtype for col, dtype in column_dtypes(dtypes).items() if dtype != 'category' and (usecols is None or col in usecols)}
+    return pd.read_csv(filename, usecols=usecols, chunksize=chunksize, dtype=types)
+
+def categorize_index(df, sourceName, dtypes=None):
+    '''Make the index of a streamed result a category, if sourceName is one in column_dtypes.'''
+    if column_dtypes(dtypes).get(sourceName) == 'category':
+        df.index = df.index.astype('category')
+    return df
+
+def streaming_groupby_mean(filename, columns, sourceName, drop_NaN=True, usecols=None, chunksize=1000000, cuts=None, dtypes=None):
+    '''Group a .csv file by sourceName and average its numeric columns, reading it in chunks
+    of chunksize rows. Only running per-source sums and counts are kept between chunks, so
+    memory scales with the number of unique sources rather than the number of rows. Gives
+    the same result as df.dropna(subset=columns).groupby(sourceName).mean(), for the rows
+    passing cuts.'''
+    sums, counts = None, None
+    for chunk in read_csv_chunks(filename, usecols=usecols, chunksize=chunksize, dtypes=dtypes):
+        if cuts:
+            chunk = chunk[cuts_mask(chunk, cuts)]
+        if drop_NaN==True:
+            chunk = chunk.dropna(subset=columns)
+        numeric = [col for col in chunk.select_dtypes('number').columns if col != sourceName]
+        types = chunk[numeric].dtypes
+        grouped = chunk[numeric].astype(np.float64).groupby(chunk[sourceName])
+        chunk_sums, chunk_counts = grouped.sum(), grouped.count()
+        if sums is None:
+            sums, counts = chunk_sums, chunk_counts
+        else:
+            sums = sums.add(chunk_sums, fill_value=0)
+            counts = counts.add(chunk_counts, fill_value=0)
+    if sums is None:
+        return pd.DataFrame()
+    # Sources whose values are all NaN in a column get 0/0 = NaN, as with groupby().mean();
+    # summed in float64, the means are given back in the columns' own dtypes
+    return categorize_index((sums/counts).astype(types), sourceName, dtypes)
+
+def best_match(df, sourceName, distance_col='angDist'):
+    '''Keep one row per source: the counterpart with the smallest distance_col (e.g. the
+    cross-match separation). Sorts once by (source, distance) and takes the first row of
+    each source, so photometry is never mixed between counterparts.'''
+    codes, _ = pd.factorize(df[sourceName])
+    distance = df[distance_col].to_numpy(dtype=np.float64)
+    # One float sort key, source code + distance scaled into [0, 0.5] (NaN distances last
+    # within their source), sorts faster than a two-key lexsort
+    scale = 2*np.nanmax(distance) if np.isfinite(distance).any() else 1.
+    fraction = np.where(np.isfinite(distance), distance/(scale if scale > 0 else 1.), 0.75)
+    order = np.argsort(codes + fraction)
+    codes = codes[order]
+    first = order[np.r_[True, codes[1:] != codes[:-1]] & (codes >= 0)]
+    return df.iloc[first].set_index(sourceName).sort_index()
+
+def weighted_sums(df, sourceName, weight_col):
+    '''Per-source sums of weight*value and of weight for the numeric columns of df, with the
+    weights taken from weight_col (e.g. a flux column); rows with non-positive weights and NaN
+    values are left out.'''
+    numeric = [col for col in df.select_dtypes('number').columns if col != sourceName]
+    values = df[numeric].astype(np.float64)
+    weights = df[weight_col].astype(np.float64).where(lambda w: w > 0)
+    grouped_by = df[sourceName]
+    sums = values.mul(weights, axis=0).groupby(grouped_by, observed=True).sum()
+    norms = values.notna().mul(weights, axis=0).groupby(grouped_by, observed=True).sum()
+    return sums, norms
+
+def weighted_mean(df, sourceName, weight_col):
+    '''Combine the counterparts of each source, weighting their columns by weight_col.'''
+    sums, norms = weighted_sums(df, sourceName, weight_col)
+    return sums/norms
+
+def check_deduplication(how, weight_col=None):
+    '''Raise ValueError for an unknown de-duplication, or "weighted" without a weight_col.'''
+    if how not in ('best', 'weighted', 'mean'):
+        raise ValueError("Unknown de-duplication: {} (use 'best', 'weighted' or 'mean')".format(how))
+    if how == 'weighted' and weight_col is None:
+        raise ValueError("De-duplication 'weighted' needs a weight_col (e.g. a flux column)")
+
+@instrumented()
+def deduplicate(df, sourceName, how='mean', distance_col='angDist', weight_col=None):
+    '''Reduce a cross-match to one row per source: "best" keeps the nearest counterpart (see
+    best_match), "weighted" combines counterparts weighted by weight_col, and "mean" averages
+    every numeric column.'''
+    check_deduplication(how, weight_col)
+    if how == 'best':
+        return best_match(df, sourceName, distance_col)
+    if how == 'weighted':
+        return weighted_mean(df, sourceName, weight_col)
+    return df.groupby(sourceName, observed=True).mean(numeric_only=True)
+
+def select_rows(df, columns, cuts=None, drop_NaN=True):
+    '''Keep the rows of df passing all the cuts and, if drop_NaN, with no NaN in columns.'''
+    if cuts:
+        with stage('cuts', rows_in=len(df)) as record:
+            df = df[cuts_mask(df, cuts)]
+            record['rows_out'] = len(df)
+    if drop_NaN==True:
+        with stage('dropna', rows_in=len(df)) as record:
+            df = df.dropna(subset=columns)
+            record['rows_out'] = len(df)
+    return df
+
+@instrumented()
+def streaming_deduplicate(filename, columns, sourceName, drop_NaN=True, usecols=None, chunksize=1000000, cuts=None,
+                          how='best', distance_col='angDist', weight_col=None, dtypes=None):
+    '''As streaming_groupby_mean, for the "best" and "weighted" de-duplications. Each chunk is
+    reduced on its own and only the per-source results are kept between chunks.'''
+    check_deduplication(how, weight_col)
+    if how == 'mean':
+        return streaming_groupby_mean(filename, columns, sourceName, drop_NaN=drop_NaN, usecols=usecols, chunksize=chunksize, cuts=cuts, dtypes=dtypes)
+    best, sums, norms = [], None, None
+    for chunk in read_csv_chunks(filename, usecols=usecols, chunksize=chunksize, dtypes=dtypes):
+        if how == 'best':
+            # The nearest counterpart is picked before any cuts (see import_csv)
+            best.append(best_match(chunk, sourceName, distance_col).reset_index())
+            continue
+        if cuts:
+            chunk = chunk[cuts_mask(chunk, cuts)]
+        if drop_NaN==True:
+            chunk = chunk.dropna(subset=columns)
+        chunk_sums, chunk_norms = weighted_sums(chunk, sourceName, weight_col)
+        if sums is None:
+            sums, norms = chunk_sums, chunk_norms
+        else:
+            sums = sums.add(chunk_sums, fill_value=0)
+            norms = norms.add(chunk_norms, fill_value=0)
+    if how == 'best':
+        if not best:
+            return pd.DataFrame()
+        best = best_match(pd.concat(best, ignore_index=True), sourceName, distance_col)
+        return select_rows(categorize_index(best, sourceName, dtypes), columns, cuts, drop_NaN)
+    return pd.DataFrame() if sums is None else categorize_index(sums/norms, sourceName, dtypes)
+
+@instrumented()
+def import_csv(filename, columns, sourceName, drop_NaN=True, keep=None, dtypes=None, chunksize=None, cuts=None,
+               how='mean', distance_col='angDist', weight_col=None):
+    '''Import contents of a .csv file into a pandas dataframe, dropping NaNs
+    when specified and grouping by specified unique identifier.
+    Only the columns in columns and keep (plus sourceName and the columns used by cuts and by
+    the de-duplication) are read; if keep is None, every column is read. Sources with several
+    rows are reduced to one as set by how (see deduplicate); for cross-match outputs how='best'
+    keeps the nearest counterpart. Rows failing any of the cuts (a list of Cut) are dropped:
+    for "mean" and "weighted" as the file is read, before grouping; for "best" only once the
+    nearest counterpart of each source has been picked, so that a source whose nearest
+    counterpart fails the cuts is dropped rather than replaced by a further one. If chunksize
+    is given, the file is streamed in chunks of that many rows (see streaming_groupby_mean)
+    instead of being loaded whole.'''
+    check_deduplication(how, weight_col)
+    cuts = [] if cuts is None else list(cuts)
+    dedupe_cols = [distance_col] if how == 'best' else [weight_col] if how == 'weighted' else []
+    read_cols = None if keep is None else list(dict.fromkeys([sourceName] + list(columns) + list(keep) + cut_columns(cuts) + dedupe_cols))
+    if chunksize is not None:
+        return streaming_deduplicate(filename, columns, sourceName, drop_NaN=drop_NaN, usecols=read_cols, chunksize=chunksize, cuts=cuts,
+                                     how=how, distance_col=distance_col, weight_col=weight_col, dtypes=dtypes)
+    if how == 'best':
+        df = load_catalog(filename, columns=read_cols, dtypes=dtypes)
+        return select_rows(deduplicate(df, sourceName, how=how, distance_col=distance_col), columns, cuts, drop_NaN)
+    df = select_rows(load_catalog(filename, columns=read_cols, dtypes=dtypes, cuts=cuts), columns, drop_NaN=drop_NaN)
+    return deduplicate(df, sourceName, how=how, distance_col=distance_col, weight_col=weight_col)
+
+if __name__ == '__main__':
+    import sys
+    for filename in sys.argv[1:]:
+        print("Converted", filename, "->", write_sidecar(filename))
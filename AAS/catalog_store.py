@@ -0,0 +1,127 @@
+# Local on-disk catalog store partitioned by HEALPix pixel (nested scheme), for serving
+# large catalogs like VPHAS DR2 (II/341/vphasp) from disk instead of re-querying VizieR.
+# Layout: <path>/meta.json plus one directory per pixel holding Parquet part files, so
+# that new rows can be appended to a pixel without rewriting what is already there.
+
+import os
+import json
+import glob
+import numpy as np
+import pandas as pd
+from astropy import units as u
+from astropy.coordinates import Longitude, Latitude
+from astropy_healpix import HEALPix
+
+# The VPHAS DR2 store that adhoc.py and tiled_download.py build and the cross-match scripts
+# read. It lives next to this module, so scripts run from any directory share it; set
+# VPHAS_STORE to keep it elsewhere (e.g. on scratch space).
+VPHAS_STORE = os.environ.get('VPHAS_STORE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vphas_store'))
+
+def load_meta(path):
+    '''Read the store description (nside, RA/dec column names, columns).'''
+    with open(os.path.join(path, 'meta.json')) as f:
+        return json.load(f)
+
+def get_healpix(meta):
+    '''Return the HEALPix grid used by a store.'''
+    return HEALPix(nside=meta['nside'], order='nested')
+
+def pixel_dir(path, ipix):
+    '''Directory holding the part files of a single pixel.'''
+    return os.path.join(path, 'pix_{:d}'.format(int(ipix)))
+
+def radec_to_pixels(meta, ra, dec):
+    '''Return the pixel index of each source.'''
+    hp = get_healpix(meta)
+    return hp.lonlat_to_healpix(Longitude(np.asarray(ra, dtype=np.float64), u.deg), Latitude(np.asarray(dec, dtype=np.float64), u.deg))
+
+def create_store(path, nside=64, ra_col='RAJ2000', dec_col='DEJ2000'):
+    '''Create an empty store, or return the description of the existing one at path.'''
+    if os.path.exists(os.path.join(path, 'meta.json')):
+        return load_meta(path)
+    os.makedirs(path, exist_ok=True)
+    meta = {'nside': nside, 'ra_col': ra_col, 'dec_col': dec_col, 'columns': None, 'nparts': 0}
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    return meta
+
+def append_to_store(path, df, nside=64, ra_col='RAJ2000', dec_col='DEJ2000'):
+    '''Add the rows of a dataframe (or astropy table) to the store, writing one part file
+    for every pixel the rows fall in. Returns the number of rows written.'''
+    if not isinstance(df, pd.DataFrame):
+        df = df.to_pandas()
+    meta = create_store(path, nside=nside, ra_col=ra_col, dec_col=dec_col)
+    if meta['columns'] is None:
+        meta['columns'] = list(df.columns)
+    df = df[meta['columns']]
+    df = df[np.isfinite(df[meta['ra_col']].values) & np.isfinite(df[meta['dec_col']].values)]
+    pixels = radec_to_pixels(meta, df[meta['ra_col']].values, df[meta['dec_col']].values)
+    order = np.argsort(pixels, kind='stable')
+    pixels = pixels[order]
+    df = df.iloc[order]
+    starts = np.flatnonzero(np.r_[True, pixels[1:] != pixels[:-1]]) if len(pixels) else []
+    ends = np.r_[starts[1:], len(pixels)] if len(pixels) else []
+    for start, end in zip(starts, ends):
+        outdir = pixel_dir(path, pixels[start])
+        os.makedirs(outdir, exist_ok=True)
+        df.iloc[start:end].to_parquet(os.path.join(outdir, 'part_{:06d}.parquet'.format(meta['nparts'])), index=False)
+    meta['nparts'] += 1
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    return len(df)
+
+def stored_pixels(path):
+    '''Return the indices of all pixels that hold data.'''
+    return np.array(sorted(int(os.path.basename(d)[4:]) for d in glob.glob(os.path.join(path, 'pix_*'))), dtype=np.int64)
+
+def query_pixels(path, pixels, columns=None):
+    '''Read the given pixels from the store, reading only the requested columns.'''
+    meta = load_meta(path)
+    if columns is None:
+        columns = meta['columns']
+    frames = []
+    for ipix in np.unique(pixels):
+        for part in sorted(glob.glob(os.path.join(pixel_dir(path, ipix), 'part_*.parquet'))):
+            frames.append(pd.read_parquet(part, columns=columns))
+    if len(frames) == 0:
+        return pd.DataFrame({col: pd.Series(dtype=np.float64) for col in columns})
+    return pd.concat(frames, ignore_index=True)
+
+def angular_separation(ra1, dec1, ra2, dec2):
+    '''Angular separation in degrees (Vincenty formula, stable at small and large angles).'''
+    ra1, dec1, ra2, dec2 = np.radians(ra1), np.radians(dec1), np.radians(ra2), np.radians(dec2)
+    dra = ra2 - ra1
+    num1 = np.cos(dec2)*np.sin(dra)
+    num2 = np.cos(dec1)*np.sin(dec2) - np.sin(dec1)*np.cos(dec2)*np.cos(dra)
+    denom = np.sin(dec1)*np.sin(dec2) + np.cos(dec1)*np.cos(dec2)*np.cos(dra)
+    return np.degrees(np.arctan2(np.hypot(num1, num2), denom))
+
+def query_cone(path, ra, dec, radius, columns=None):
+    '''Return all sources within radius (in degrees, or an astropy Quantity) of (ra, dec).'''
+    meta = load_meta(path)
+    radius = u.Quantity(radius, u.deg)
+    pixels = get_healpix(meta).cone_search_lonlat(Longitude(ra, u.deg), Latitude(dec, u.deg), radius)
+    read_columns = None if columns is None else list(dict.fromkeys(list(columns) + [meta['ra_col'], meta['dec_col']]))
+    df = query_pixels(path, pixels, columns=read_columns)
+    inside = angular_separation(ra, dec, df[meta['ra_col']].values, df[meta['dec_col']].values) <= radius.to(u.deg).value
+    df = df[inside].reset_index(drop=True)
+    return df if columns is None else df[list(columns)]
+
+def query_box(path, ra_min, ra_max, dec_min, dec_max, columns=None):
+    '''Return all sources with ra_min <= RA < ra_max and dec_min <= dec < dec_max (degrees).
+    If ra_min > ra_max the box is taken to wrap through RA = 0.'''
+    meta = load_meta(path)
+    ra_width = (ra_max - ra_min) % 360
+    ra_center = (ra_min + ra_width/2) % 360
+    dec_center = (dec_min + dec_max)/2
+    # Cone that circumscribes the box; the exact cut is applied to the rows afterwards
+    corners_ra = np.array([ra_min, ra_min, ra_min + ra_width, ra_min + ra_width])
+    corners_dec = np.array([dec_min, dec_max, dec_min, dec_max])
+    radius = angular_separation(ra_center, dec_center, corners_ra, corners_dec).max()
+    pixels = get_healpix(meta).cone_search_lonlat(Longitude(ra_center, u.deg), Latitude(dec_center, u.deg), radius*u.deg)
+    read_columns = None if columns is None else list(dict.fromkeys(list(columns) + [meta['ra_col'], meta['dec_col']]))
+    df = query_pixels(path, pixels, columns=read_columns)
+    ra, dec = df[meta['ra_col']].values, df[meta['dec_col']].values
+    inside = ((ra - ra_min) % 360 < ra_width) & (dec >= dec_min) & (dec < dec_max)
+    df = df[inside].reset_index(drop=True)
+    return df if columns is None else df[list(columns)]
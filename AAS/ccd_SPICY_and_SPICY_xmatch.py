@@ -7,18 +7,10 @@ from astropy import units as u
 import pylab as pl
 import matplotlib as mpl
 from adaptive_param_plot import *
+from catalog_loader import import_csv
 
 plt.rcParams['text.latex.preamble'] = [r'\usepackage{gensymb}']
 
-def import_csv(filename, columns, sourceName, drop_NaN=True):
-    '''Import contents of a .csv file into a pandas dataframe, dropping NaNs
-    when specified and grouping by specified unique identifier.'''
-    df = pd.read_csv(filename)
-    if drop_NaN==True:
-        df = df.dropna(subset=columns)
-    df = df.groupby(sourceName).mean()
-    return df
-
 def get_data(df):
     '''Get data from a given dataframe.'''
     df_3p6, df_4p5, df_5p8, df_8p0 = df['mag3_6'].values, df['mag4_5'].values, df['mag5_8'].values, df['mag8_0'].values
@@ -38,8 +30,8 @@ def plot_contoured_ccd(total_x, total_y, subset_x, subset_y, x_lab, y_lab, bins)
     plt.savefig("SPICY_YSOs_covered_by_VPHAS.png", dpi=250, facecolor='w', edgecolor='w')
     # plt.show()
 
-total = import_csv('table1.csv',columns=['mag3_6','mag4_5','mag5_8','mag8_0'],sourceName='SPICY')
-subset = import_csv('xmatch_SPICY_VPHAS.csv',columns=['mag3_6','mag4_5','mag5_8','mag8_0'],sourceName='SPICY')
+total = import_csv('table1.csv',columns=['mag3_6','mag4_5','mag5_8','mag8_0'],sourceName='SPICY',keep=[])
+subset = import_csv('xmatch_SPICY_VPHAS.csv',columns=['mag3_6','mag4_5','mag5_8','mag8_0'],sourceName='SPICY',keep=[],how='best')
 
 total_3p6, total_4p5, total_5p8, total_8p0 = get_data(total)
 subset_3p6, subset_4p5, subset_5p8, subset_8p0 = get_data(subset)
@@ -0,0 +1,94 @@
+# All-pairs color-color matrix: every color from a set of bands (e.g. [3.6]-[4.5], Ha-r, ...),
+# plotted against every other color as a corner plot of contoured CCDs. The colors are computed
+# in one vectorized pass, each color is binned once, and the histograms of all panels are
+# accumulated together, so adding bands does not mean re-reading or re-binning the data.
+# Every pair of N bands gives N(N-1)/2 colors and a corner plot of that many rows, so by default
+# only a handful of colors is plotted; pass colors= to choose them, or bands= for all pairs.
+
+import itertools
+import numpy as np
+import matplotlib.pyplot as plt
+from adaptive_param_plot import *
+from colors import magnitudes, color_label, parse_color
+
+# The colors plotted when neither colors nor bands are given (a 5 x 5 corner plot)
+DEFAULT_COLORS = ['[3.6]-[4.5]', '[5.8]-[8.0]', 'Ha-r', 'r-i', 'J-H', 'H-Ks']
+
+def selected_colors(df, names, cache=None):
+    '''Return the given color names (e.g. "Ha-r") and an (N_sources x N_colors) array of their
+    values. Sources missing any of the bands are dropped.'''
+    pairs = [parse_color(name) for name in names]
+    bands = list(dict.fromkeys(band for pair in pairs for band in pair))
+    mags = magnitudes(df, bands, cache)
+    mags = np.column_stack([mags[band] for band in bands])
+    mags = mags[np.isfinite(mags).all(axis=1)]
+    i = np.array([bands.index(pair[0]) for pair in pairs])
+    j = np.array([bands.index(pair[1]) for pair in pairs])
+    return list(names), mags[:, i] - mags[:, j]
+
+def all_colors(df, bands, cache=None):
+    '''Return the names of every color band1-band2 (band1 before band2 in bands) and an
+    (N_sources x N_colors) array of their values. Sources missing any band are dropped.'''
+    i, j = np.triu_indices(len(bands), k=1)
+    return selected_colors(df, ['{}-{}'.format(bands[a], bands[b]) for a, b in zip(i, j)], cache)
+
+def pair_histograms(colors, bins=20, percentiles=(0.5, 99.5), max_cells=2**22):
+    '''Bin every color once and accumulate the 2D histograms of all pairs of colors together.
+    The bin edges of each color span the given percentiles of its values.
+    Returns the list of color pairs, the edges of each color, the bin index of every source in
+    every color (as from bin_points), and the histograms (N_pairs x nbins x nbins).'''
+    lo, hi = np.percentile(colors, percentiles, axis=0)
+    edges = [np.linspace(lo[k], hi[k], bins+1) for k in range(colors.shape[1])]
+    d = np.column_stack([digitize_edges(colors[:, k], edges[k]) for k in range(colors.shape[1])])
+    pairs = list(itertools.combinations(range(colors.shape[1]), 2))
+    a = np.array([p[0] for p in pairs])
+    b = np.array([p[1] for p in pairs])
+    # Every (pair, x bin, y bin), including the out-of-range bins, gets one slot of a flat
+    # array, so all the pair histograms are filled by one bincount per chunk of sources
+    nslots = (bins+2)**2
+    offsets = np.arange(len(pairs))*nslots
+    counts = np.zeros(len(pairs)*nslots, dtype='int64')
+    # Sources are taken in chunks so that the (sources x pairs) index array stays below max_cells
+    chunk_size = max(max_cells//len(pairs), 1)
+    for start in range(0, len(colors), chunk_size):
+        chunk = d[start:start+chunk_size]
+        flat = offsets + chunk[:, a]*(bins+2) + chunk[:, b]
+        counts += np.bincount(flat.ravel(), minlength=len(pairs)*nslots)
+    H = counts.reshape(len(pairs), bins+2, bins+2)[:, 1:-1, 1:-1].astype('float')
+    return pairs, edges, d, H
+
+def plot_color_matrix(df, colors=None, bands=None, bins=20, threshold=10, color='#DE5F85', label=None, cache=None, output=None):
+    '''Plot every color against every other one as a corner plot. The colors are the given
+    list of color names (e.g. ["[3.6]-[4.5]", "Ha-r"]), or all those from pairs of bands if
+    bands is given instead, or DEFAULT_COLORS.'''
+    if colors is not None and bands is not None:
+        raise ValueError("Give either colors or bands, not both")
+    if colors is None and bands is not None:
+        names, colors = all_colors(df, bands, cache)
+    else:
+        names, colors = selected_colors(df, DEFAULT_COLORS if colors is None else colors, cache)
+    pairs, edges, d, H = pair_histograms(colors, bins=bins)
+    ncolors = len(names)
+    fig, axes = plt.subplots(ncolors-1, ncolors-1, figsize=(2*(ncolors-1), 2*(ncolors-1)), squeeze=False)
+    for ax in axes.flat:
+        ax.set_visible(False)
+    for k, (a, b) in enumerate(pairs):
+        # color a on the x axis of column a, color b on the y axis of row b-1
+        ax = axes[b-1, a]
+        ax.set_visible(True)
+        adaptive_param_plot(colors[:, a], colors[:, b], axis=ax, threshold=threshold,
+                            binned=(H[k], edges[a], edges[b], d[:, a], d[:, b]),
+                            marker_color=color, colors=color, fill=False, alpha=1, cmap=None,
+                            label=label)
+        if b == ncolors-1:
+            ax.set_xlabel(color_label(names[a]))
+        else:
+            ax.set_xticklabels([])
+        if a == 0:
+            ax.set_ylabel(color_label(names[b]))
+        else:
+            ax.set_yticklabels([])
+    fig.tight_layout()
+    if output is not None:
+        fig.savefig(output, dpi=150, facecolor='w', edgecolor='w')
+    return fig, axes
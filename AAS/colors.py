@@ -0,0 +1,84 @@
+# Evaluate colors such as "[5.8]-[8.0]" or "Ha-r" over a loaded catalog.
+# Each band is looked up in whatever form the catalog has it (a magnitude column, as in
+# SPICY and VPHAS, or a flux column, as in c2d and Alcala+2017). Only the bands that the
+# requested colors need are computed; all flux bands are converted to magnitudes in a single
+# call, and the magnitudes are kept in a cache so later colors reuse them.
+
+import re
+import numpy as np
+from photometry import COLUMNS, fluxes_to_mags
+from run_report import instrumented
+
+# Columns each band may be found in, in order of preference: a magnitude column, then a
+# flux column that is converted with the photometric registry
+BANDS = {
+    '[3.6]': ['mag3_6', 'FIR1'],
+    '[4.5]': ['mag4_5', 'FIR2'],
+    '[5.8]': ['mag5_8', 'FIR3'],
+    '[8.0]': ['mag8_0', 'FIR4'],
+    '[24]': ['mag24', 'FMP1'],
+    'J': ['Jmag', 'FJ'],
+    'H': ['Hmag', 'FH'],
+    'Ks': ['Ksmag', 'FKs'],
+    'u': ['umag'],
+    'g': ['gmag'],
+    'r': ['rmag'],
+    'r2': ['r2mag'],
+    'i': ['imag'],
+    'Ha': ['Hamag', 'FHa'],
+}
+
+LABELS = {'Ha': r'H$\mathrm{\alpha}$'}
+
+def parse_color(expr):
+    '''Split a color expression such as "[5.8]-[8.0]" or "Ha - r" into its two bands.'''
+    match = re.match(r'^\s*(\[[^\]]+\]|\w+)\s*-\s*(\[[^\]]+\]|\w+)\s*$', expr)
+    if match is None:
+        raise ValueError("Could not parse color expression: {}".format(expr))
+    return match.group(1), match.group(2)
+
+def color_label(expr):
+    '''Axis label for a color, e.g. "[5.8] - [8.0]".'''
+    band1, band2 = parse_color(expr)
+    return LABELS.get(band1, band1) + ' - ' + LABELS.get(band2, band2)
+
+def find_band(df, band):
+    '''Return (column, is_flux) for the column of df holding the given band.'''
+    for col in BANDS[band]:
+        if col in COLUMNS:
+            # Flux column; use its magnitude column instead if that was already computed
+            if COLUMNS[col][2] in df.columns:
+                return COLUMNS[col][2], False
+            if col in df.columns:
+                return col, True
+        elif col in df.columns:
+            return col, False
+    raise KeyError("Catalog has no column for band {} (tried {})".format(band, BANDS[band]))
+
+def magnitudes(df, bands, cache=None):
+    '''Return a dict of band -> magnitude array for df, computing only the bands that are not
+    already in cache. All flux bands are converted together.'''
+    if cache is None:
+        cache = {}
+    todo = [band for band in dict.fromkeys(bands) if band not in cache]
+    flux_cols, flux_bands = [], []
+    for band in todo:
+        col, is_flux = find_band(df, band)
+        if is_flux:
+            flux_cols.append(col)
+            flux_bands.append(band)
+        else:
+            cache[band] = df[col].to_numpy(dtype=np.float64)
+    if len(flux_cols) > 0:
+        mags = fluxes_to_mags(df[flux_cols].to_numpy(dtype=np.float64), [COLUMNS[col][0] for col in flux_cols], [COLUMNS[col][1] for col in flux_cols])
+        for i, band in enumerate(flux_bands):
+            cache[band] = mags[:, i]
+    return {band: cache[band] for band in bands}
+
+@instrumented()
+def evaluate_colors(df, exprs, cache=None):
+    '''Evaluate a list of color expressions over df, returning a dict of expression -> array.
+    Pass the same cache dict in later calls on the same df to reuse its magnitudes.'''
+    pairs = [parse_color(expr) for expr in exprs]
+    mags = magnitudes(df, [band for pair in pairs for band in pair], cache)
+    return {expr: mags[band1] - mags[band2] for expr, (band1, band2) in zip(exprs, pairs)}
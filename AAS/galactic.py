@@ -0,0 +1,68 @@
+# Convert equatorial (ICRS) coordinates to Galactic l/b for whole catalogs.
+# ICRS -> Galactic is a fixed rotation, so instead of building a SkyCoord for every source the
+# rotation matrix is taken from astropy once and applied to unit vectors in chunks, optionally
+# across threads (NumPy releases the GIL in these operations).
+
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from astropy import units as u
+from astropy.coordinates import SkyCoord
+from local_xmatch import radec_to_xyz
+from run_report import instrumented
+
+@lru_cache(maxsize=None)
+def icrs_to_galactic_matrix():
+    '''Rotation matrix taking ICRS unit vectors to Galactic ones, read off astropy by
+    transforming the three ICRS axes.'''
+    axes = SkyCoord(x=[1., 0., 0.], y=[0., 1., 0.], z=[0., 0., 1.], representation_type='cartesian', frame='icrs')
+    gal = axes.galactic.cartesian
+    # Column k is the Galactic vector of ICRS axis k
+    return np.vstack([gal.x.value, gal.y.value, gal.z.value])
+
+def rotate_chunk(ra, dec, l, b, matrix):
+    '''Fill l and b (in degrees) for one chunk of ra and dec (in degrees).'''
+    xyz = radec_to_xyz(ra, dec) @ matrix.T
+    np.degrees(np.arctan2(xyz[:, 1], xyz[:, 0]), out=l)
+    np.mod(l, 360., out=l)
+    np.degrees(np.arctan2(xyz[:, 2], np.hypot(xyz[:, 0], xyz[:, 1])), out=b)
+
+@instrumented()
+def radec_to_lb(ra, dec, chunk_size=1000000, workers=1):
+    '''Convert ICRS RA and dec in degrees to Galactic l and b in degrees, chunk_size sources
+    at a time, spread over the given number of threads. NaN coordinates give NaN.'''
+    ra = np.asarray(ra, dtype=np.float64)
+    dec = np.asarray(dec, dtype=np.float64)
+    l = np.empty(ra.shape)
+    b = np.empty(ra.shape)
+    matrix = icrs_to_galactic_matrix()
+    starts = range(0, len(ra), chunk_size)
+    chunk = lambda start: rotate_chunk(ra[start:start+chunk_size], dec[start:start+chunk_size],
+                                       l[start:start+chunk_size], b[start:start+chunk_size], matrix)
+    if workers > 1 and len(starts) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(chunk, starts))
+    else:
+        for start in starts:
+            chunk(start)
+    return l, b
+
+def lb_to_radec(l, b):
+    '''Convert Galactic l and b in degrees to ICRS RA and dec in degrees (the inverse rotation).'''
+    xyz = radec_to_xyz(l, b) @ icrs_to_galactic_matrix()
+    ra = np.mod(np.degrees(np.arctan2(xyz[:, 1], xyz[:, 0])), 360.)
+    dec = np.degrees(np.arctan2(xyz[:, 2], np.hypot(xyz[:, 0], xyz[:, 1])))
+    return ra, dec
+
+def add_galactic(df, ra_col='RAJ2000', dec_col='DEJ2000', l_col='GLON', b_col='GLAT', **kwargs):
+    '''Add Galactic longitude and latitude columns (in degrees) to a dataframe.'''
+    df[l_col], df[b_col] = radec_to_lb(df[ra_col].to_numpy(), df[dec_col].to_numpy(), **kwargs)
+    return df
+
+def max_error_mas(ra, dec, **kwargs):
+    '''Largest angular distance (in milliarcseconds) between radec_to_lb and astropy's
+    SkyCoord.galactic over the given coordinates.'''
+    l, b = radec_to_lb(ra, dec, **kwargs)
+    ours = SkyCoord(l=l*u.deg, b=b*u.deg, frame='galactic')
+    theirs = SkyCoord(ra=np.asarray(ra)*u.deg, dec=np.asarray(dec)*u.deg, frame='icrs').galactic
+    return ours.separation(theirs).to(u.mas).max().value
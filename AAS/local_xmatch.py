@@ -0,0 +1,60 @@
+# Cross-match two catalogs on disk without going through the VizieR xMatch service.
+# match_indices finds every pair of sources within max_distance with a KD-tree on the sphere,
+# and join_matches lays the pairs out as XMatch.query does: angDist (arcsec) first, then the
+# columns of both tables, with _1/_2 suffixes on column names they share.
+
+import numpy as np
+import pandas as pd
+from astropy import units as u
+from scipy.spatial import cKDTree
+from run_report import instrumented
+
+def radec_to_xyz(ra, dec):
+    '''Convert RA and dec in degrees to unit vectors, so that a KD-tree can be used on the sphere.'''
+    ra = np.radians(np.asarray(ra, dtype=np.float64))
+    dec = np.radians(np.asarray(dec, dtype=np.float64))
+    cos_dec = np.cos(dec)
+    return np.column_stack((cos_dec*np.cos(ra), cos_dec*np.sin(ra), np.sin(dec)))
+
+def chord_to_arcsec(chord):
+    '''Convert the straight-line distance between two unit vectors to an angle in arcseconds.'''
+    return np.degrees(2*np.arcsin(np.clip(chord/2, 0, 1)))*3600
+
+@instrumented()
+def match_indices(ra1, dec1, ra2, dec2, max_distance, chunk_size=1000000):
+    '''Find every pair of sources within max_distance of each other.
+    Sources in the first catalog are matched in chunks of chunk_size rows so that memory
+    use is set by chunk_size and the size of the second catalog, not by the number of pairs
+    tried. Returns row indices into both catalogs and the separations in arcseconds,
+    sorted by first-catalog row and then by separation.'''
+    max_chord = 2*np.sin(0.5*u.Quantity(max_distance, u.arcsec).to(u.rad).value)
+    xyz2 = radec_to_xyz(ra2, dec2)
+    ok2 = np.isfinite(xyz2).all(axis=1)
+    tree2 = cKDTree(xyz2[ok2])
+    index2 = np.flatnonzero(ok2)
+    idx1, idx2, dist = [], [], []
+    for start in range(0, len(ra1), chunk_size):
+        xyz1 = radec_to_xyz(ra1[start:start+chunk_size], dec1[start:start+chunk_size])
+        ok1 = np.isfinite(xyz1).all(axis=1)
+        if not ok1.any():
+            continue
+        pairs = cKDTree(xyz1[ok1]).sparse_distance_matrix(tree2, max_chord, output_type='ndarray')
+        idx1.append(np.flatnonzero(ok1)[pairs['i']] + start)
+        idx2.append(index2[pairs['j']])
+        dist.append(chord_to_arcsec(pairs['v']))
+    if len(idx1) == 0:
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp), np.zeros(0)
+    idx1, idx2, dist = np.concatenate(idx1), np.concatenate(idx2), np.concatenate(dist)
+    order = np.lexsort((dist, idx1))
+    return idx1[order], idx2[order], dist[order]
+
+def join_matches(df1, df2, idx1, idx2, dist):
+    '''Lay out matched rows (e.g. from match_indices) of two dataframes like XMatch.query:
+    angDist (arcsec) first, then the columns of both catalogs, with _1/_2 suffixes on the
+    names they share.'''
+    shared = set(df1.columns) & set(df2.columns)
+    left = df1.iloc[idx1].reset_index(drop=True).rename(columns={c: c + '_1' for c in shared})
+    right = df2.iloc[idx2].reset_index(drop=True).rename(columns={c: c + '_2' for c in shared})
+    result = pd.concat([left, right], axis=1)
+    result.insert(0, 'angDist', dist)
+    return result
@@ -0,0 +1,91 @@
+# Registry of the photometric filters used in this project, and vectorized conversion of
+# catalog fluxes to (Vega) magnitudes. Zero points, reference wavelengths and bandwidths
+# are from the SVO Filter Profile Service (http://svo2.cab.inta-csic.es/theory/fps/).
+# Keep every zero point here, so that all scripts agree on them.
+
+from collections import namedtuple
+import numpy as np
+from run_report import instrumented
+
+Filter = namedtuple('Filter', ['zero_point_Jy', 'wavelength_AA', 'bandwidth_AA'])
+
+SPEED_OF_LIGHT_AA_PER_S = 2.99792458e18
+
+FILTERS = {
+    # Spitzer IRAC and MIPS (http://svo2.cab.inta-csic.es/theory/fps/index.php?mode=browse&gname=Spitzer)
+    'IRAC1': Filter(277.2, 35500., 6836.),
+    'IRAC2': Filter(179.0, 44930., 8649.),
+    'IRAC3': Filter(113.8, 57310., 12561.),
+    'IRAC4': Filter(62.0, 78720., 25288.),
+    'MIPS24': Filter(7.17, 236800., 53200.),
+    # 2MASS
+    '2MASS_J': Filter(1594.0, 12350., 1624.),
+    '2MASS_H': Filter(1024.0, 16620., 2509.),
+    '2MASS_Ks': Filter(666.8, 21590., 2619.),
+    # VST OmegaCAM, used by VPHAS (bandwidths are FWHM values)
+    # http://svo2.cab.inta-csic.es/theory/fps/index.php?id=Paranal/OmegaCAM.r_SDSS&&mode=search&search_instrument=OmegaCAM#filter
+    # http://svo2.cab.inta-csic.es/theory/fps/index.php?id=Paranal/OmegaCAM.Halpha&&mode=search&search_instrument=OmegaCAM#filter
+    # VPHAS gives u, g and i as magnitudes already, so only r and H-alpha are needed here
+    'VST_r': Filter(3094.61, 6257., 1362.89),
+    'VST_Ha': Filter(2659.39, 6588., 102.69),
+    # INT WFC, used by IPHAS
+    # http://svo2.cab.inta-csic.es/theory/fps/index.php?id=INT/IPHAS.Ha&&mode=browse&gname=INT&gname2=IPHAS#filter
+    'INT_Ha': Filter(2609.54, 6568., 95.),
+}
+
+# Catalog flux columns: the filter they were measured in, their unit, and the name used for
+# the magnitude column derived from them. 'mJy' columns are flux densities; 'mW/m2' columns
+# are line fluxes (Alcala+2017 FHa, in 10^-3 W/m^2), spread over the filter to get a flux density.
+COLUMNS = {
+    'FIR1': ('IRAC1', 'mJy', 'FIR1_mag'),
+    'FIR2': ('IRAC2', 'mJy', 'FIR2_mag'),
+    'FIR3': ('IRAC3', 'mJy', 'FIR3_mag'),
+    'FIR4': ('IRAC4', 'mJy', 'FIR4_mag'),
+    'FMP1': ('MIPS24', 'mJy', 'FMP1_mag'),
+    'FJ': ('2MASS_J', 'mJy', 'FJ_mag'),
+    'FH': ('2MASS_H', 'mJy', 'FH_mag'),
+    'FKs': ('2MASS_Ks', 'mJy', 'FKs_mag'),
+    'FHa': ('VST_Ha', 'mW/m2', 'Hamag'),
+}
+
+def to_Jy_factor(filter, unit):
+    '''Factor that converts a flux in the given unit to a flux density in Jy for a filter.'''
+    if unit == 'Jy':
+        return 1.
+    if unit == 'mJy':
+        return 1e-3
+    if unit == 'mW/m2':
+        # Divide the line flux by the frequency of the filter (W/m^2/Hz), then 1 Jy = 1e-26 W/m^2/Hz
+        frequency_Hz = SPEED_OF_LIGHT_AA_PER_S/FILTERS[filter].wavelength_AA
+        return 1e-3/frequency_Hz*1e26
+    raise ValueError("Unknown flux unit: {}".format(unit))
+
+@instrumented()
+def fluxes_to_mags(fluxes, filters, units='mJy'):
+    '''Convert an (N_sources x N_bands) array of fluxes to magnitudes in one pass.
+    filters is a list of N_bands filter names from FILTERS; units is one unit for all bands
+    or a list with one per band. Non-positive fluxes give NaN.'''
+    fluxes = np.asarray(fluxes, dtype=np.float64)
+    if isinstance(units, str):
+        units = [units]*len(filters)
+    # -2.5 log10(f*k/ZP) = -2.5 log10(f) + 2.5 log10(ZP/k), with the second term per band
+    offsets = np.array([2.5*np.log10(FILTERS[f].zero_point_Jy/to_Jy_factor(f, unit)) for f, unit in zip(filters, units)])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mags = -2.5*np.log10(np.where(fluxes > 0, fluxes, np.nan))
+    mags += offsets
+    return mags
+
+@instrumented()
+def add_magnitudes(df, columns):
+    '''Add magnitude columns (named as in COLUMNS) to a dataframe for the given flux columns.'''
+    filters = [COLUMNS[col][0] for col in columns]
+    units = [COLUMNS[col][1] for col in columns]
+    mags = fluxes_to_mags(df[columns].to_numpy(dtype=np.float64), filters, units)
+    for i, col in enumerate(columns):
+        df[COLUMNS[col][2]] = mags[:, i]
+    return df
+
+def mags_to_fluxes(mags, filters):
+    '''Convert an (N_sources x N_bands) array of magnitudes to flux densities in Jy.'''
+    zero_points = np.array([FILTERS[f].zero_point_Jy for f in filters])
+    return zero_points*10**(-0.4*np.asarray(mags, dtype=np.float64))
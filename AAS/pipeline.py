@@ -0,0 +1,175 @@
+# Run the chain of catalog scripts (queries -> cross-matches -> joins -> figures) from a JSON
+# pipeline definition (see pipeline.json), rebuilding only what is out of date:
+#     python pipeline.py pipeline.json --workers 4
+# Each stage declares its script, arguments, inputs and outputs. A stage is skipped when the
+# hash of its script, the local modules it imports (e.g. catalog_loader.py), its arguments
+# and input files matches the one recorded the last time it ran successfully and all its
+# outputs exist. Stages that do not depend on each other
+# (e.g. the SPICY and Alcala branches) run in parallel.
+
+import os
+import sys
+import ast
+import json
+import hashlib
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+STATE_FILE = '.pipeline_state.json'
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def load_pipeline(filename):
+    '''Read a pipeline definition, making its paths absolute (they are relative to the file).'''
+    with open(filename) as f:
+        spec = json.load(f)
+    base = os.path.dirname(os.path.abspath(filename))
+    stages = {}
+    for name, stage in spec['stages'].items():
+        cwd = os.path.normpath(os.path.join(base, stage.get('cwd', '.')))
+        stages[name] = {
+            'script': os.path.normpath(os.path.join(base, stage['script'])),
+            'args': stage.get('args', []),
+            'cwd': cwd,
+            'inputs': [os.path.normpath(os.path.join(cwd, p)) for p in stage.get('inputs', [])],
+            'outputs': [os.path.normpath(os.path.join(cwd, p)) for p in stage.get('outputs', [])],
+        }
+    return stages, os.path.join(base, spec.get('state', STATE_FILE))
+
+def load_state(path):
+    if not os.path.exists(path):
+        return {'stages': {}, 'files': {}}
+    with open(path) as f:
+        return json.load(f)
+
+def save_state(path, state):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=1)
+    os.replace(path + '.tmp', path)
+
+def file_digest(path, state):
+    '''SHA-256 of a file's contents. Digests are remembered by size and modification time,
+    so large catalogs are only re-read when they change.'''
+    stat = os.stat(path)
+    known = state['files'].get(path)
+    if known is not None and known['size'] == stat.st_size and known['mtime'] == stat.st_mtime_ns:
+        return known['sha256']
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 24), b''):
+            h.update(block)
+    state['files'][path] = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'sha256': h.hexdigest()}
+    return h.hexdigest()
+
+def local_modules(script, found=None):
+    '''Files of the project modules a script imports, directly or through other project
+    modules: those next to it or in this directory (which run_stage puts on PYTHONPATH).'''
+    found = set() if found is None else found
+    with open(script) as f:
+        tree = ast.parse(f.read(), filename=script)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names.add(node.module.split('.')[0])
+    for name in sorted(names):
+        for directory in (os.path.dirname(script), HERE):
+            path = os.path.join(directory, name + '.py')
+            if os.path.exists(path):
+                if path not in found:
+                    found.add(path)
+                    local_modules(path, found)
+                break
+    return found
+
+def stage_key(stage, state):
+    '''Hash of everything that determines a stage's outputs; None if an input is missing.'''
+    digests = {}
+    if not os.path.exists(stage['script']):
+        return None
+    for path in [stage['script']] + sorted(local_modules(stage['script'])) + stage['inputs']:
+        if not os.path.exists(path):
+            return None
+        digests[path] = file_digest(path, state)
+    description = {'files': digests, 'args': stage['args']}
+    return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+def dependencies(stages):
+    '''For each stage, the stages that produce one of its inputs.'''
+    producers = {path: name for name, stage in stages.items() for path in stage['outputs']}
+    return {name: sorted({producers[p] for p in stage['inputs'] if p in producers and producers[p] != name})
+            for name, stage in stages.items()}
+
+def is_stale(name, stage, state, key):
+    return key is None or state['stages'].get(name) != key or not all(os.path.exists(p) for p in stage['outputs'])
+
+def run_stage(name, stage):
+    '''Run a stage's script in its own process, with the project modules on PYTHONPATH.'''
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([HERE] + ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+    env.setdefault('MPLBACKEND', 'Agg')
+    result = subprocess.run([sys.executable, stage['script']] + list(stage['args']), cwd=stage['cwd'], env=env)
+    return result.returncode
+
+def run_pipeline(filename, workers=4, force=(), dry_run=False):
+    '''Run every stale stage of a pipeline, each as soon as the stages it depends on are done.
+    Returns a dict of stage -> 'skipped', 'ran', 'failed' or 'blocked' (an upstream stage failed),
+    or 'stale' for the stages that would run when dry_run is set.'''
+    stages, state_path = load_pipeline(filename)
+    deps = dependencies(stages)
+    state = load_state(state_path)
+    status = {}
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while len(status) < len(stages):
+            resolved = len(status)
+            for name, stage in stages.items():
+                if name in status or name in running or not all(d in status for d in deps[name]):
+                    continue
+                if any(status[d] in ('failed', 'blocked') for d in deps[name]):
+                    status[name] = 'blocked'
+                    print("[{}] blocked by a failed upstream stage".format(name))
+                    continue
+                # A stage whose upstream stages ran is checked against their new outputs; in
+                # a dry run those do not exist yet, so it is reported as stale
+                upstream_stale = dry_run and any(status[d] == 'stale' for d in deps[name])
+                key = None if upstream_stale else stage_key(stage, state)
+                if name not in force and not upstream_stale and not is_stale(name, stage, state, key):
+                    status[name] = 'skipped'
+                    print("[{}] up to date".format(name))
+                elif dry_run:
+                    status[name] = 'stale'
+                    print("[{}] would run".format(name))
+                else:
+                    print("[{}] running {}".format(name, os.path.basename(stage['script'])))
+                    running[name] = pool.submit(run_stage, name, stage)
+            if not running:
+                if len(status) == resolved:
+                    raise ValueError("Pipeline stages depend on each other in a cycle: {}".format(sorted(set(stages) - set(status))))
+                continue
+            done, _ = wait(running.values(), return_when=FIRST_COMPLETED)
+            for name in [n for n, future in running.items() if future in done]:
+                returncode = running.pop(name).result()
+                if returncode == 0 and all(os.path.exists(p) for p in stages[name]['outputs']):
+                    status[name] = 'ran'
+                    # Record the key of the inputs the stage actually ran on
+                    state['stages'][name] = stage_key(stages[name], state)
+                    save_state(state_path, state)
+                    print("[{}] done".format(name))
+                else:
+                    status[name] = 'failed'
+                    state['stages'].pop(name, None)
+                    save_state(state_path, state)
+                    print("[{}] FAILED (exit code {})".format(name, returncode))
+    return status
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the stale stages of a catalog pipeline.")
+    parser.add_argument('pipeline', help="JSON pipeline definition")
+    parser.add_argument('--workers', type=int, default=4, help="number of stages to run at once")
+    parser.add_argument('--force', nargs='*', default=[], help="stages to run even if up to date")
+    parser.add_argument('--dry-run', action='store_true', help="only report which stages would run")
+    args = parser.parse_args()
+    status = run_pipeline(args.pipeline, workers=args.workers, force=set(args.force), dry_run=args.dry_run)
+    sys.exit(1 if any(s in ('failed', 'blocked') for s in status.values()) else 0)
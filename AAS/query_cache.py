@@ -0,0 +1,113 @@
+# On-disk cache for VizieR and xMatch query results. Each result is stored under a hash of
+# everything that determines it (catalog ID, columns, constraints, match parameters, and the
+# contents of any uploaded table), so repeat runs read it from disk instead of the network.
+# Results are stored as Parquet; the least recently used ones are evicted once the cache
+# grows past MAX_CACHE_BYTES. The cache lives next to this module, so scripts run from any
+# directory share it; set QUERY_CACHE_DIR to keep it elsewhere (e.g. on scratch space).
+
+import os
+import json
+import glob
+import hashlib
+import numpy as np
+from astropy import units as u
+from astropy.table import Table
+from astroquery.vizier import Vizier
+from astroquery.xmatch import XMatch
+
+CACHE_DIR = os.environ.get('QUERY_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'query_cache'))
+MAX_CACHE_BYTES = 2*1024**3
+
+def table_fingerprint(tbl):
+    '''Hash the column names and contents of an astropy table.'''
+    h = hashlib.sha256()
+    for name in tbl.colnames:
+        h.update(name.encode())
+        data = np.asarray(tbl[name])
+        if data.dtype.kind == 'O':
+            data = data.astype('U')
+        h.update(np.ascontiguousarray(data).tobytes())
+    return h.hexdigest()
+
+def describe(value):
+    '''Make a query parameter JSON-serialisable, in a form that is stable between runs.'''
+    if isinstance(value, Table):
+        return {'table': table_fingerprint(value)}
+    if isinstance(value, u.Quantity):
+        return {'value': value.value.tolist(), 'unit': str(value.unit)}
+    if isinstance(value, (list, tuple)):
+        return [describe(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): describe(v) for k, v in value.items()}
+    return value
+
+def cache_key(params):
+    '''Return the content hash identifying a query.'''
+    return hashlib.sha256(json.dumps(describe(params), sort_keys=True, default=str).encode()).hexdigest()
+
+def cache_path(key, cache_dir=CACHE_DIR):
+    '''File holding the cached result for a key.'''
+    return os.path.join(cache_dir, key + '.parquet')
+
+def load(key, cache_dir=CACHE_DIR):
+    '''Return the cached table for a key, or None if it is not in the cache.'''
+    path = cache_path(key, cache_dir)
+    if not os.path.exists(path):
+        return None
+    os.utime(path) # Mark as recently used
+    return Table.read(path, format='parquet')
+
+def save(key, tbl, params, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    '''Store a result and its query description, then evict old entries if needed.'''
+    os.makedirs(cache_dir, exist_ok=True)
+    path = cache_path(key, cache_dir)
+    tbl.write(path + '.tmp', format='parquet', overwrite=True)
+    os.replace(path + '.tmp', path)
+    with open(os.path.join(cache_dir, key + '.json'), 'w') as f:
+        json.dump(describe(params), f, sort_keys=True, default=str)
+    evict(max_bytes, cache_dir)
+
+def evict(max_bytes=MAX_CACHE_BYTES, cache_dir=CACHE_DIR):
+    '''Remove least recently used results until the cache is no larger than max_bytes.'''
+    paths = sorted(glob.glob(os.path.join(cache_dir, '*.parquet')), key=os.path.getmtime)
+    total = sum(os.path.getsize(path) for path in paths)
+    for path in paths:
+        if total <= max_bytes:
+            break
+        total -= os.path.getsize(path)
+        remove(os.path.basename(path)[:-len('.parquet')], cache_dir)
+
+def remove(key, cache_dir=CACHE_DIR):
+    '''Remove a single entry from the cache.'''
+    for path in [cache_path(key, cache_dir), os.path.join(cache_dir, key + '.json')]:
+        if os.path.exists(path):
+            os.remove(path)
+
+def invalidate(catalog=None, cache_dir=CACHE_DIR):
+    '''Remove every cached result involving the given catalog (or everything, if None).'''
+    for path in glob.glob(os.path.join(cache_dir, '*.json')):
+        with open(path) as f:
+            params = json.load(f)
+        if catalog is None or catalog in (params.get('catalog'), params.get('cat1'), params.get('cat2')):
+            remove(os.path.basename(path)[:-len('.json')], cache_dir)
+
+def cached_query_constraints(catalog, columns=['*'], row_limit=50, cache_dir=CACHE_DIR, **constraints):
+    '''Cached version of Vizier(columns=..., row_limit=...).query_constraints(catalog=..., ...)[0].'''
+    params = {'kind': 'query_constraints', 'catalog': catalog, 'columns': list(columns), 'row_limit': row_limit, 'constraints': constraints}
+    key = cache_key(params)
+    tbl = load(key, cache_dir)
+    if tbl is None:
+        tbl = Vizier(columns=columns, row_limit=row_limit).query_constraints(catalog=catalog, **constraints)[0]
+        save(key, tbl, params, cache_dir)
+    return tbl
+
+def cached_xmatch(cat1, cat2, max_distance, colRA1=None, colDec1=None, colRA2=None, colDec2=None, cache_dir=CACHE_DIR):
+    '''Cached version of XMatch.query with the same arguments.'''
+    params = {'kind': 'xmatch', 'cat1': cat1, 'cat2': cat2, 'max_distance': max_distance,
+              'colRA1': colRA1, 'colDec1': colDec1, 'colRA2': colRA2, 'colDec2': colDec2}
+    key = cache_key(params)
+    tbl = load(key, cache_dir)
+    if tbl is None:
+        tbl = XMatch.query(cat1=cat1, cat2=cat2, max_distance=max_distance, colRA1=colRA1, colDec1=colDec1, colRA2=colRA2, colDec2=colDec2)
+        save(key, tbl, params, cache_dir)
+    return tbl
@@ -0,0 +1,165 @@
+# Opt-in timing and memory instrumentation of the catalog scripts, written as a JSON run report.
+# The loader, the conversions, the quality cuts, the cross-match and the plotting functions are
+# wrapped in named stages; when a report is requested, each stage records its wall time, CPU
+# time, the peak RSS of the process when it ended (and how much it raised it) and the number of
+# rows going in and out. Stages nest: import_csv contains load_catalog, which contains the cuts.
+# Set RUN_REPORT to a file, or to an existing directory to get one report per run in it:
+#     RUN_REPORT=reports/ python ccd_spitzer_and_H_alpha.py
+# or call enable(path) (e.g. batch_ccd.py --report). When RUN_REPORT is not set the stages
+# only check a flag, so the instrumentation costs nothing in normal runs.
+
+import os
+import sys
+import json
+import time
+import atexit
+import resource
+import threading
+import functools
+from contextlib import contextmanager
+from datetime import datetime
+
+STATE = {'path': None, 'started': None, 'start_time': None, 'start_cpu': None, 'records': [], 'next_id': 0}
+STACK = threading.local()
+
+def enabled():
+    return STATE['path'] is not None
+
+def enable(path):
+    '''Start recording stages, and write the report to path (a file, or a directory to write a
+    uniquely named report in) when the process exits. Worker processes started afterwards
+    record their stages too, and hand them back with take().'''
+    if enabled():
+        return
+    STATE.update(path=path, started=datetime.now().isoformat(timespec='seconds'),
+                 start_time=time.perf_counter(), start_cpu=time.process_time())
+    os.environ['RUN_REPORT'] = path
+    # Only the process that enabled the report writes it
+    os.environ['RUN_REPORT_PID'] = os.environ.get('RUN_REPORT_PID', str(os.getpid()))
+    atexit.register(write_at_exit)
+
+def peak_rss_mb():
+    '''Peak resident set size of this process so far (ru_maxrss is in kilobytes on Linux, bytes on macOS).'''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak/2**20 if sys.platform == 'darwin' else peak/2**10
+
+def count_rows(obj):
+    '''Number of rows in a dataframe, array or table; of the first item of a tuple or dict of
+    them (e.g. the indices returned by match_indices); None for anything else.'''
+    if isinstance(obj, tuple) and len(obj) > 0:
+        return count_rows(obj[0])
+    if isinstance(obj, dict):
+        return count_rows(next(iter(obj.values()))) if len(obj) > 0 else 0
+    if isinstance(obj, (str, bytes)) or not hasattr(obj, '__len__'):
+        return None
+    try:
+        return len(obj)
+    except TypeError:
+        return None
+
+@contextmanager
+def stage(name, rows_in=None):
+    '''Record a stage of work. Yields a dict in which rows_out (and rows_in, if only known
+    later) can be set; when reports are off the dict is thrown away.'''
+    record = {'rows_in': rows_in, 'rows_out': None}
+    if not enabled():
+        yield record
+        return
+    stack = STACK.__dict__.setdefault('ids', [])
+    record.update(name=name, id=STATE['next_id'], parent=stack[-1] if stack else None, pid=os.getpid(),
+                  start_s=time.perf_counter() - STATE['start_time'])
+    STATE['next_id'] += 1
+    STATE['records'].append(record)
+    stack.append(record['id'])
+    start, start_cpu, start_peak = time.perf_counter(), time.process_time(), peak_rss_mb()
+    try:
+        yield record
+    except BaseException as e:
+        record['error'] = type(e).__name__
+        raise
+    finally:
+        stack.pop()
+        record['wall_s'] = time.perf_counter() - start
+        record['cpu_s'] = time.process_time() - start_cpu
+        record['peak_rss_mb'] = peak_rss_mb()
+        record['peak_rss_growth_mb'] = record['peak_rss_mb'] - start_peak
+
+def instrumented(name=None, count_out=True):
+    '''Decorator recording every call of a function as a stage (named after the function
+    unless given a name), with the rows of its first argument in and, if count_out is set,
+    of its result out.'''
+    def decorate(func):
+        label = name or func.__name__
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled():
+                return func(*args, **kwargs)
+            with stage(label, rows_in=count_rows(args[0]) if args else None) as record:
+                result = func(*args, **kwargs)
+                if count_out:
+                    record['rows_out'] = count_rows(result)
+            return result
+        return wrapper
+    return decorate
+
+def take():
+    '''Remove and return the stages recorded so far by this process (for a worker process to
+    send back to the one writing the report).'''
+    records, STATE['records'] = STATE['records'], []
+    return records
+
+def add(records):
+    '''Add stages recorded by a worker process.'''
+    STATE['records'].extend(records)
+
+def summarize(records):
+    '''Totals per stage name, slowest first. Self time excludes the time spent in nested stages.'''
+    children = {}
+    for r in records:
+        if r['parent'] is not None:
+            key = (r['pid'], r['parent'])
+            children[key] = children.get(key, 0.) + r['wall_s']
+    summary = {}
+    for r in records:
+        s = summary.setdefault(r['name'], {'calls': 0, 'wall_s': 0., 'self_s': 0., 'cpu_s': 0.,
+                                           'rows_in': 0, 'rows_out': 0, 'max_peak_rss_growth_mb': 0.})
+        s['calls'] += 1
+        s['wall_s'] += r['wall_s']
+        s['self_s'] += r['wall_s'] - children.get((r['pid'], r['id']), 0.)
+        s['cpu_s'] += r['cpu_s']
+        s['rows_in'] += r['rows_in'] or 0
+        s['rows_out'] += r['rows_out'] or 0
+        s['max_peak_rss_growth_mb'] = max(s['max_peak_rss_growth_mb'], r['peak_rss_growth_mb'])
+    return dict(sorted(summary.items(), key=lambda item: -item[1]['self_s']))
+
+def report():
+    '''The run report: the command, totals for the run, the totals per stage and every stage.'''
+    records = [r for r in STATE['records'] if 'wall_s' in r]
+    return {'command': [sys.executable] + sys.argv, 'cwd': os.getcwd(), 'started': STATE['started'],
+            'wall_s': time.perf_counter() - STATE['start_time'], 'cpu_s': time.process_time() - STATE['start_cpu'],
+            'peak_rss_mb': peak_rss_mb(), 'summary': summarize(records), 'stages': records}
+
+def write(path=None):
+    '''Write the run report; returns its filename.'''
+    path = path or STATE['path']
+    if os.path.isdir(path):
+        script = os.path.splitext(os.path.basename(sys.argv[0]))[0].lstrip('-') or 'python'
+        path = os.path.join(path, '{}_{}_{}.json'.format(script, datetime.now().strftime('%Y%m%d-%H%M%S'), os.getpid()))
+    with open(path + '.tmp', 'w') as f:
+        json.dump(report(), f, indent=1)
+    os.replace(path + '.tmp', path)
+    return path
+
+def write_at_exit():
+    if enabled() and os.environ.get('RUN_REPORT_PID') == str(os.getpid()):
+        print("Run report written to", write())
+
+def reset_in_child():
+    # A forked worker starts with a copy of the parent's stages; it only reports its own
+    STATE['records'] = []
+    STACK.ids = []
+
+os.register_at_fork(after_in_child=reset_in_child)
+
+if os.environ.get('RUN_REPORT'):
+    enable(os.environ['RUN_REPORT'])
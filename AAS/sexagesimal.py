@@ -0,0 +1,96 @@
+# Parse sexagesimal coordinates ("16 08 14.96", "-38:57:14.5", "16h08m14.96s", ...) to decimal
+# degrees for whole columns at once. The strings are viewed as one (N_rows x width) array of
+# character codes and the three fields of every row are read off with array operations, so no
+# Python code runs per row. Fixed-width columns, as VizieR writes them, take a faster path.
+
+import numpy as np
+
+ZERO, NINE, DOT, MINUS, SPACE = ord('0'), ord('9'), ord('.'), ord('-'), ord(' ')
+SCALES = [1., 60., 3600.]
+
+def as_codes(values):
+    '''View a sequence of strings as an (N_rows x width) array of character codes, padded with
+    zeros. Unicode (UCS-4) and byte strings are viewed in place, without copying.'''
+    values = np.asarray(values)
+    if values.dtype.kind not in 'US':
+        values = values.astype(str)
+    values = np.ascontiguousarray(values)
+    code = np.uint32 if values.dtype.kind == 'U' else np.uint8
+    width = values.dtype.itemsize//np.dtype(code).itemsize
+    return values.view(code).reshape(len(values), width)
+
+def layout_weights(is_num, is_digit):
+    '''For one row, the weight of each character position in the final value (10**place/scale
+    for digits, 0 elsewhere), or None if the row does not have three numeric fields.'''
+    weights = np.zeros(len(is_num))
+    fields = []
+    for j in range(len(is_num)):
+        if is_num[j] and (j == 0 or not is_num[j-1]):
+            fields.append([])
+        if is_num[j]:
+            fields[-1].append(j)
+    if len(fields) != 3:
+        return None
+    for positions, scale in zip(fields, SCALES):
+        digits = [j for j in positions if is_digit[j]]
+        dots = [j for j in positions if not is_digit[j]]
+        # Digits before the dot have places len-1, ..., 0; digits after it -1, -2, ...
+        n_int = len([j for j in digits if not dots or j < dots[0]])
+        for place, j in zip(range(n_int-1, n_int-1-len(digits), -1), digits):
+            weights[j] = 10.**place/scale
+    return weights
+
+def parse_sexagesimal(values):
+    '''Parse "a b c" (with any non-numeric separators) to a + b/60 + c/3600, with the sign of
+    the whole value taken from a leading "-". Rows without three numeric fields give NaN.'''
+    chars = as_codes(values)
+    n, width = chars.shape
+    if n == 0:
+        return np.zeros(0)
+    is_digit = (chars >= ZERO) & (chars <= NINE)
+    is_num = is_digit | (chars == DOT)
+    # The first non-blank character decides the sign
+    first = np.argmax((chars != SPACE) & (chars != 0), axis=1)
+    negative = chars[np.arange(n), first] == MINUS
+    if (is_num == is_num[0]).all() and (is_digit == is_digit[0]).all():
+        # Fixed-width column: every row has its digits in the same places, so the value is a
+        # weighted sum of the digit columns
+        weights = layout_weights(is_num[0], is_digit[0])
+        if weights is None:
+            return np.full(n, np.nan)
+        cols = np.flatnonzero(weights)
+        result = (chars[:, cols].astype(np.float64) - ZERO) @ weights[cols]
+        return np.where(negative, -result, result)
+    # Number each run of numeric characters in a row: 0, 1, 2, ...
+    starts = is_num & ~np.pad(is_num, ((0, 0), (1, 0)))[:, :-1]
+    field = np.cumsum(starts, axis=1) - 1
+    nfields = starts.sum(axis=1)
+    result = np.zeros(n)
+    for k, scale in enumerate(SCALES):
+        in_field = is_num & (field == k)
+        value = np.zeros(n)
+        decimals = np.zeros(n)
+        seen_dot = np.zeros(n, dtype=bool)
+        for j in range(width):
+            digit = in_field[:, j] & is_digit[:, j]
+            value = np.where(digit, value*10 + (chars[:, j].astype(np.float64) - ZERO), value)
+            decimals += digit & seen_dot
+            seen_dot |= in_field[:, j] & (chars[:, j] == DOT)
+        result += value/10**decimals/scale
+    result[nfields != 3] = np.nan
+    return np.where(negative, -result, result)
+
+def parse_ra(values):
+    '''Parse sexagesimal right ascensions (hours, minutes, seconds) to degrees.'''
+    return 15*parse_sexagesimal(values)
+
+def parse_dec(values):
+    '''Parse sexagesimal declinations (degrees, arcminutes, arcseconds) to degrees.'''
+    return parse_sexagesimal(values)
+
+def add_degree_columns(tbl, ra_col='RAJ2000', dec_col='DEJ2000', ra_name='ra', dec_name='dec'):
+    '''Add RA and dec columns in decimal degrees to an astropy table with sexagesimal ones.'''
+    tbl.add_column(name=ra_name, col=parse_ra(tbl[ra_col]))
+    tbl.add_column(name=dec_name, col=parse_dec(tbl[dec_col]))
+    tbl[ra_name].unit = tbl[dec_name].unit = 'deg'
+    return tbl
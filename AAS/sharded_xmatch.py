@@ -0,0 +1,211 @@
+# Cross-match a catalog (e.g. SPICY table1 or c2d) against the local VPHAS store in shards,
+# one sky tile per task, so the work can be spread over a SLURM job array:
+#     python sharded_xmatch.py plan table1.csv vphas_store shards --ra-col ra --dec-col dec
+#     python sharded_xmatch.py sbatch shards/plan.json
+#     jid=$(sbatch --parsable shards/xmatch_array.sbatch); sbatch --dependency=afterok:$jid shards/xmatch_merge.sbatch
+# or, without a scheduler, over a local pool of processes:
+#     python sharded_xmatch.py local shards/plan.json --workers 4
+# Every source of the first catalog belongs to exactly one tile (its half-open RA/dec box), and
+# each tile reads the store over a box padded by the match radius, so matches across tile
+# edges are found once and only once. The merge step collects the tiles into one table laid
+# out like the output of XMatch.query (see local_xmatch.py).
+
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from catalog_loader import load_catalog, best_match, Cut
+from catalog_store import query_box, load_meta
+from local_xmatch import match_indices, join_matches
+from tiled_download import make_tiles
+
+def shard_filename(work_dir, index):
+    '''Output file of one shard.'''
+    return os.path.join(work_dir, 'shard_{:05d}.parquet'.format(index))
+
+def owned(ra, dec, tile):
+    '''Mask of the sources inside a tile's half-open RA/dec box.'''
+    return (ra >= tile['ra_min']) & (ra < tile['ra_max']) & (dec >= tile['dec_min']) & (dec < tile['dec_max'])
+
+def tile_cuts(tile, ra_col, dec_col):
+    '''Cuts selecting the sources of a tile while the catalog is read (see owned).'''
+    return [Cut(ra_col, '>=', tile['ra_min']), Cut(ra_col, '<', tile['ra_max']),
+            Cut(dec_col, '>=', tile['dec_min']), Cut(dec_col, '<', tile['dec_max'])]
+
+def plan_shards(catalog, store_path, work_dir, ra_col='RAJ2000', dec_col='DEJ2000', max_distance=1.,
+                tile_size=1., columns1=None, columns2=None):
+    '''Split the footprint of a catalog into tiles and write the plan (work_dir/plan.json).
+    Only tiles holding sources of the catalog become shards. max_distance is in arcseconds.
+    Returns the path of the plan.'''
+    os.makedirs(work_dir, exist_ok=True)
+    df = load_catalog(catalog, columns=[ra_col, dec_col])
+    ra, dec = df[ra_col].to_numpy(dtype=np.float64), df[dec_col].to_numpy(dtype=np.float64)
+    good = np.isfinite(ra) & np.isfinite(dec)
+    ra, dec = ra[good], dec[good]
+    # Widen the top edges slightly so that the last sources fall inside the half-open tiles
+    tiles = make_tiles(ra.min(), ra.max() + 1e-9, dec.min(), dec.max() + 1e-9, tile_size=tile_size)
+    shards = [tile for tile in tiles if owned(ra, dec, tile).any()]
+    for index, tile in enumerate(shards):
+        tile['index'] = index
+    plan = {'catalog': os.path.abspath(catalog), 'store': os.path.abspath(store_path), 'work_dir': os.path.abspath(work_dir),
+            'ra_col': ra_col, 'dec_col': dec_col, 'max_distance': max_distance,
+            'columns1': columns1, 'columns2': columns2, 'shards': shards}
+    path = os.path.join(work_dir, 'plan.json')
+    with open(path, 'w') as f:
+        json.dump(plan, f, indent=1)
+    print("Planned {} shards ({} tiles in the footprint)".format(len(shards), len(tiles)))
+    return path
+
+def load_plan(path):
+    with open(path) as f:
+        return json.load(f)
+
+def padded_box(tile, pad):
+    '''RA/dec box (degrees) around a tile, padded by pad degrees on the sky.'''
+    dec_min, dec_max = max(tile['dec_min'] - pad, -90.), min(tile['dec_max'] + pad, 90.)
+    cos_dec = np.cos(np.radians(max(abs(dec_min), abs(dec_max))))
+    ra_pad = pad/cos_dec if cos_dec > pad/180 else 180.
+    if tile['ra_max'] - tile['ra_min'] + 2*ra_pad >= 360:
+        return 0., 360., dec_min, dec_max
+    return (tile['ra_min'] - ra_pad) % 360, (tile['ra_max'] + ra_pad) % 360, dec_min, dec_max
+
+def match_store(df1, store_path, tile, ra_col, dec_col, max_distance, columns2=None):
+    '''Cross-match the sources of df1, which all lie in tile, against the sources of the store
+    within max_distance (arcsec) of the tile; only those are read. Returns the matches laid
+    out as by join_matches.'''
+    df2 = query_box(store_path, *padded_box(tile, max_distance/3600), columns=columns2)
+    meta = load_meta(store_path)
+    idx1, idx2, dist = match_indices(df1[ra_col].to_numpy(dtype=np.float64), df1[dec_col].to_numpy(dtype=np.float64),
+                                     df2[meta['ra_col']].to_numpy(dtype=np.float64), df2[meta['dec_col']].to_numpy(dtype=np.float64),
+                                     max_distance)
+    return join_matches(df1, df2, idx1, idx2, dist)
+
+def run_shard(plan_path, index):
+    '''Cross-match the sources of one shard against the store and write the shard output.
+    Returns the number of matches.'''
+    plan = load_plan(plan_path)
+    tile = plan['shards'][index]
+    ra_col, dec_col = plan['ra_col'], plan['dec_col']
+    columns1 = None if plan['columns1'] is None else list(dict.fromkeys([ra_col, dec_col] + plan['columns1']))
+    # Only the tile's sources are read, so a task's memory does not grow with the catalog;
+    # owned() settles the sources on the tile edges exactly as the plan did
+    df1 = load_catalog(plan['catalog'], columns=columns1, cuts=tile_cuts(tile, ra_col, dec_col))
+    ra1, dec1 = df1[ra_col].to_numpy(dtype=np.float64), df1[dec_col].to_numpy(dtype=np.float64)
+    df1 = df1[owned(ra1, dec1, tile)].reset_index(drop=True)
+    result = match_store(df1, plan['store'], tile, ra_col, dec_col, plan['max_distance'], columns2=plan['columns2'])
+    filename = shard_filename(plan['work_dir'], index)
+    result.to_parquet(filename + '.tmp', index=False)
+    os.replace(filename + '.tmp', filename)
+    return len(result)
+
+def merge_shards(plan_path, output, id_col=None, how=None):
+    '''Collect the shard outputs into one table and write it to output (.csv or .parquet).
+    With how='best' and the catalog's source ID column as id_col, only the nearest match of
+    each source is kept (see catalog_loader.best_match). Raises if a shard is missing.'''
+    plan = load_plan(plan_path)
+    files = [shard_filename(plan['work_dir'], i) for i in range(len(plan['shards']))]
+    missing = [i for i, f in enumerate(files) if not os.path.exists(f)]
+    if missing:
+        raise RuntimeError("Shards not finished: {}".format(missing))
+    frames = [pd.read_parquet(f) for f in files]
+    result = pd.concat([f for f in frames if len(f) > 0] or frames[:1], ignore_index=True)
+    if how == 'best':
+        result = best_match(result, id_col).reset_index()
+    if output.endswith('.parquet'):
+        result.to_parquet(output, index=False)
+    else:
+        result.to_csv(output, index=False)
+    print("Merged {} shards, {} matches -> {}".format(len(files), len(result), output))
+    return result
+
+def run_local(plan_path, workers=4, output=None, **merge_kwargs):
+    '''Run every unfinished shard on a local pool of processes, then merge them if output is given.'''
+    plan = load_plan(plan_path)
+    todo = [i for i in range(len(plan['shards'])) if not os.path.exists(shard_filename(plan['work_dir'], i))]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(run_shard, [plan_path]*len(todo), todo))
+    if output is not None:
+        return merge_shards(plan_path, output, **merge_kwargs)
+
+SBATCH_HEADER = '''#!/bin/bash
+#SBATCH --job-name={job_name}
+#SBATCH --output={log}
+#SBATCH --mail-type=END,FAIL
+#SBATCH --account={account}
+#SBATCH --qos={qos}
+#SBATCH --ntasks=1
+#SBATCH --cpus-per-task={cpus}
+#SBATCH --mem={mem}
+#SBATCH --time={time}
+'''
+
+def write_sbatch(plan_path, account='adamginsburg', qos='adamginsburg', cpus=1, mem='3gb', time='04:00:00',
+                 max_running=50, merge_args=''):
+    '''Write a job-array script running one shard per task, and a merge script to submit with
+    --dependency=afterok on the array; merge_args are passed on to the merge command
+    (e.g. '--output xmatch_SPICY_VPHAS.csv'). Returns the paths of both scripts.'''
+    plan = load_plan(plan_path)
+    work_dir = plan['work_dir']
+    script = os.path.abspath(__file__)
+    plan_path = os.path.abspath(plan_path)
+    options = dict(account=account, qos=qos, cpus=cpus, mem=mem, time=time)
+    array = os.path.join(work_dir, 'xmatch_array.sbatch')
+    with open(array, 'w') as f:
+        f.write(SBATCH_HEADER.format(job_name='xmatch_shard', log=os.path.join(work_dir, 'shard_%A_%a.log'), **options))
+        f.write('#SBATCH --array=0-{}%{}\n'.format(len(plan['shards']) - 1, max_running))
+        f.write('date; hostname; pwd;\n\n')
+        f.write('export PYTHONPATH={}:$PYTHONPATH\n'.format(os.path.dirname(script)))
+        f.write('python {} run {} $SLURM_ARRAY_TASK_ID\n\n'.format(script, plan_path))
+        f.write('date\n')
+    merge = os.path.join(work_dir, 'xmatch_merge.sbatch')
+    with open(merge, 'w') as f:
+        f.write(SBATCH_HEADER.format(job_name='xmatch_merge', log=os.path.join(work_dir, 'merge_%j.log'), **options))
+        f.write('date; hostname; pwd;\n\n')
+        f.write('export PYTHONPATH={}:$PYTHONPATH\n'.format(os.path.dirname(script)))
+        f.write(' '.join(['python', script, 'merge', plan_path] + merge_args.split()) + '\n\n')
+        f.write('date\n')
+    print("Submit with: jid=$(sbatch --parsable {}); sbatch --dependency=afterok:$jid {}".format(array, merge))
+    return array, merge
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Cross-match a catalog against the local VPHAS store in sky-tile shards.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('plan', help="split the catalog footprint into shards")
+    p.add_argument('catalog')
+    p.add_argument('store')
+    p.add_argument('work_dir')
+    p.add_argument('--ra-col', default='RAJ2000')
+    p.add_argument('--dec-col', default='DEJ2000')
+    p.add_argument('--max-distance', type=float, default=1., help="match radius in arcsec")
+    p.add_argument('--tile-size', type=float, default=1., help="tile size in degrees")
+    p = sub.add_parser('run', help="cross-match one shard (e.g. $SLURM_ARRAY_TASK_ID)")
+    p.add_argument('plan')
+    p.add_argument('index', type=int)
+    for name, help in [('merge', "merge the shard outputs"), ('local', "run all shards on local processes, then merge")]:
+        p = sub.add_parser(name, help=help)
+        p.add_argument('plan')
+        p.add_argument('--output', default='xmatch_shards.csv')
+        p.add_argument('--id-col', default=None, help="source ID column, for --best")
+        p.add_argument('--best', action='store_true', help="keep only the nearest match of each source")
+        if name == 'local':
+            p.add_argument('--workers', type=int, default=4)
+    p = sub.add_parser('sbatch', help="write the SLURM job-array and merge scripts")
+    p.add_argument('plan')
+    p.add_argument('--mem', default='3gb')
+    p.add_argument('--time', default='04:00:00')
+    p.add_argument('--max-running', type=int, default=50)
+    p.add_argument('--merge-args', default='', help="arguments for the merge command, e.g. '--output out.csv'")
+    args = parser.parse_args()
+    if args.command == 'plan':
+        plan_shards(args.catalog, args.store, args.work_dir, ra_col=args.ra_col, dec_col=args.dec_col,
+                    max_distance=args.max_distance, tile_size=args.tile_size)
+    elif args.command == 'run':
+        print("Shard {}: {} matches".format(args.index, run_shard(args.plan, args.index)))
+    elif args.command == 'merge':
+        merge_shards(args.plan, args.output, id_col=args.id_col, how='best' if args.best else None)
+    elif args.command == 'local':
+        run_local(args.plan, workers=args.workers, output=args.output, id_col=args.id_col, how='best' if args.best else None)
+    elif args.command == 'sbatch':
+        write_sbatch(args.plan, mem=args.mem, time=args.time, max_running=args.max_running, merge_args=args.merge_args)
@@ -0,0 +1,168 @@
+# Synthetic catalogs shaped like the ones this project reads, for testing and benchmarking at
+# any size (from the 46 Alcala rows up to hundreds of millions of VPHAS rows):
+#     python synthetic_catalogs.py vphas 1e7 vphas_synthetic.csv
+# Each kind has the column names, units and missing-value patterns of the real catalog, a
+# realistic sky distribution (SPICY and VPHAS along the Galactic plane, c2d in a few clouds),
+# magnitudes drawn from a rising luminosity function with errors that grow towards the faint
+# limit, and, for the cross-match kinds, several counterparts for some of the sources.
+# Catalogs are generated and written in chunks, so memory does not grow with their size.
+
+import argparse
+import numpy as np
+import pandas as pd
+from galactic import lb_to_radec, radec_to_lb
+from photometry import mags_to_fluxes
+from local_xmatch import join_matches
+
+# Bands of each catalog: (magnitude or flux column, bright limit, faint limit, fraction missing)
+SPICY_BANDS = [('mag3_6', 7., 16.5, 0.02), ('mag4_5', 7., 16., 0.02), ('mag5_8', 6., 14.5, 0.15),
+               ('mag8_0', 5., 13.5, 0.25), ('mag24', 2., 9., 0.7)]
+VPHAS_BANDS = [('umag', 13., 21., 0.3), ('gmag', 13., 22., 0.1), ('rmag', 13., 21.5, 0.), ('r2mag', 13., 21.5, 0.1),
+               ('Hamag', 12.5, 20.5, 0.05), ('imag', 12., 20.5, 0.05)]
+C2D_BANDS = [('FJ', '2MASS_J', 9., 16.5, 0.2), ('FH', '2MASS_H', 8., 15.5, 0.2), ('FKs', '2MASS_Ks', 8., 15., 0.2),
+             ('FIR1', 'IRAC1', 7., 17.5, 0.1), ('FIR2', 'IRAC2', 7., 17., 0.15), ('FIR3', 'IRAC3', 6., 15., 0.4),
+             ('FIR4', 'IRAC4', 5., 14., 0.5), ('FMP1', 'MIPS24', 2., 9.5, 0.85)]
+# Clouds observed by c2d: (l, b, radius) in degrees
+C2D_CLOUDS = [(339., 16., 3.), (353., 17., 3.), (160., -20., 3.), (31., 5., 1.5), (298., -16., 2.)]
+SPICY_CLASSES = ['ClassI', 'FS', 'ClassII', 'ClassIII/Contaminant']
+C2D_TYPES = ['star', 'YSOc', 'Galc', 'red', 'rising']
+
+def plane_positions(rng, n, l_min, l_width, b_scale, b_max):
+    '''Sources spread uniformly in l over [l_min, l_min + l_width) and concentrated towards
+    b = 0 (Laplace distribution of the given scale, cut at |b| < b_max).'''
+    l = (l_min + rng.uniform(0, l_width, n)) % 360
+    b = np.clip(rng.laplace(0, b_scale, n), -b_max, b_max)
+    return lb_to_radec(l, b)
+
+def cloud_positions(rng, n):
+    '''Sources scattered around the c2d clouds.'''
+    cloud = rng.integers(0, len(C2D_CLOUDS), n)
+    l0, b0, radius = np.array(C2D_CLOUDS)[cloud].T
+    b = np.clip(b0 + rng.normal(0, radius/2, n), -90, 90)
+    l = (l0 + rng.normal(0, radius/2, n)/np.cos(np.radians(b))) % 360
+    return lb_to_radec(l, b)
+
+def depths(rng, n, span=9.):
+    '''How far each source is below the faint limit of a survey (magnitude minus faint limit),
+    from a luminosity function rising as 10**(0.3 m) over span magnitudes.'''
+    return np.log10(rng.uniform(10**(-0.3*span), 1, n))/0.3
+
+def magnitudes(rng, n, bright, faint, missing, depth):
+    '''Magnitudes in one band of sources at the given depths, with some scatter and errors
+    growing towards the faint limit. A fraction of them is missing, as are those beyond the
+    faint limit (not detected in that band).'''
+    mag = np.maximum(faint + depth + rng.normal(0, 0.2, n), bright)
+    err = 0.005 + 0.2*10**(0.4*(mag - faint))
+    lost = (rng.random(n) < missing) | (mag > faint)
+    mag[lost] = np.nan
+    err[lost] = np.nan
+    return mag.astype(np.float32), err.astype(np.float32)
+
+def make_spicy(rng, n, start=0):
+    '''SPICY table1: YSO candidates along the plane (255 < l < 110, |b| < 1) with IRAC/MIPS magnitudes.'''
+    ra, dec = plane_positions(rng, n, 255., 215., 0.3, 1.)
+    df = {'SPICY': np.arange(start, start + n), 'ra': ra, 'dec': dec}
+    df['GLON'], df['GLAT'] = radec_to_lb(ra, dec)
+    depth = depths(rng, n)
+    for col, bright, faint, missing in SPICY_BANDS:
+        df[col], df['e_' + col] = magnitudes(rng, n, bright, faint, missing, depth)
+    df['class'] = np.array(SPICY_CLASSES)[rng.choice(len(SPICY_CLASSES), n, p=[0.1, 0.1, 0.6, 0.2])]
+    return pd.DataFrame(df)
+
+def make_vphas(rng, n, start=0):
+    '''VPHAS DR2 (II/341/vphasp): the southern plane (210 < l < 40, |b| < 5) in ugri and H-alpha.'''
+    ra, dec = plane_positions(rng, n, 210., 190., 1.5, 5.)
+    df = {'sourceID': np.arange(start, start + n), 'RAJ2000': ra, 'DEJ2000': dec}
+    depth = depths(rng, n)
+    for col, bright, faint, missing in VPHAS_BANDS:
+        if col == 'Hamag':
+            # A tail of H-alpha emitters, bright in Ha relative to r
+            excess = np.where(rng.random(n) < 0.02, rng.exponential(0.8, n), 0.)
+            df[col], df['e_' + col] = magnitudes(rng, n, bright, faint, missing, depth - excess)
+        else:
+            df[col], df['e_' + col] = magnitudes(rng, n, bright, faint, missing, depth)
+    return pd.DataFrame(df)
+
+def make_c2d(rng, n, start=0):
+    '''c2d (II/332/c2d): sources around the nearby clouds, with 2MASS/IRAC/MIPS fluxes in mJy.'''
+    ra, dec = cloud_positions(rng, n)
+    df = {'c2d': np.arange(start, start + n), 'RAJ2000': ra, 'DEJ2000': dec}
+    depth = depths(rng, n)
+    for col, filter, bright, faint, missing in C2D_BANDS:
+        mag, err = magnitudes(rng, n, bright, faint, missing, depth)
+        flux = mags_to_fluxes(mag[:, None], [filter])[:, 0]*1e3
+        df[col] = flux
+        df['e_' + col] = flux*err/1.0857
+    df['OType'] = np.array(C2D_TYPES)[rng.choice(len(C2D_TYPES), n, p=[0.8, 0.05, 0.05, 0.05, 0.05])]
+    return pd.DataFrame(df)
+
+# Position columns of each kind
+POSITIONS = {make_spicy: ('ra', 'dec'), make_vphas: ('RAJ2000', 'DEJ2000'), make_c2d: ('RAJ2000', 'DEJ2000')}
+
+def make_xmatch(make1, make2, rng, n, start=0, duplicate_rate=0.15, max_distance=1.):
+    '''Cross-match output (as from XMatch.query) of n rows: each source of the first catalog
+    has 1 + Poisson(duplicate_rate) counterparts within max_distance arcsec: the true
+    counterpart, usually within 0.3 max_distance, and field sources mostly further out. The
+    counterparts of a source are sorted by distance, so the first one is the closest.'''
+    n_sources = max(int(round(n/(1 + duplicate_rate))), 1)
+    counts = 1 + rng.poisson(duplicate_rate, n_sources)
+    counts = counts[np.cumsum(counts) <= n] if counts.sum() > n else counts
+    counts = np.r_[counts, np.ones(n - counts.sum(), dtype=counts.dtype)]
+    df1 = make1(rng, len(counts), start)
+    idx1 = np.repeat(np.arange(len(counts)), counts)
+    df2 = make2(rng, n, start)
+    first = np.r_[True, idx1[1:] != idx1[:-1]]
+    dist = np.where(first, np.abs(rng.normal(0, 0.15, n)), rng.uniform(0.2, 1, n))*max_distance
+    # idx1 is already sorted, so this only reorders the distances within each source
+    dist = dist[np.lexsort((dist, idx1))]
+    # Move the counterparts to their distance from the source, in a random direction
+    ra1, dec1 = (df1[c].to_numpy()[idx1] for c in POSITIONS[make1])
+    angle = rng.uniform(0, 2*np.pi, n)
+    dec2 = np.clip(dec1 + dist*np.cos(angle)/3600, -90, 90)
+    ra2 = (ra1 + dist*np.sin(angle)/3600/np.maximum(np.cos(np.radians(dec1)), 1e-6)) % 360
+    df2[POSITIONS[make2][0]], df2[POSITIONS[make2][1]] = ra2, dec2
+    return join_matches(df1, df2, idx1, np.arange(n), dist)
+
+KINDS = {
+    'spicy': make_spicy,
+    'vphas': make_vphas,
+    'c2d': make_c2d,
+    'xmatch_spicy_vphas': lambda rng, n, start=0, **kwargs: make_xmatch(make_spicy, make_vphas, rng, n, start, **kwargs),
+    'xmatch_c2d_vphas': lambda rng, n, start=0, **kwargs: make_xmatch(make_vphas, make_c2d, rng, n, start, **kwargs),
+}
+
+def generate(kind, n, seed=0, start=0, **kwargs):
+    '''Generate n rows of a synthetic catalog as a dataframe (IDs numbered from start).'''
+    return KINDS[kind](np.random.default_rng(seed), int(n), start, **kwargs)
+
+def write_catalog(kind, n, filename, chunk_size=1000000, seed=0, **kwargs):
+    '''Write n rows of a synthetic catalog to a .csv or .parquet file, chunk_size rows at a time.
+    Each chunk is drawn from its own seed, (seed, chunk number), so the file is reproducible.'''
+    n = int(n)
+    parquet = filename.endswith('.parquet')
+    writer = None
+    for i, start in enumerate(range(0, n, chunk_size)):
+        df = generate(kind, min(chunk_size, n - start), seed=(seed, i), start=start, **kwargs)
+        if parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            tbl = pa.Table.from_pandas(df, preserve_index=False)
+            writer = writer or pq.ParquetWriter(filename, tbl.schema)
+            writer.write_table(tbl)
+        else:
+            df.to_csv(filename, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+    if writer is not None:
+        writer.close()
+    return filename
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Write a synthetic catalog.")
+    parser.add_argument('kind', choices=sorted(KINDS))
+    parser.add_argument('rows', type=float, help="number of rows (e.g. 1e6)")
+    parser.add_argument('output', help=".csv or .parquet file")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk-size', type=int, default=1000000)
+    parser.add_argument('--duplicate-rate', type=float, default=None, help="extra counterparts per source (cross-match kinds)")
+    args = parser.parse_args()
+    kwargs = {} if args.duplicate_rate is None else {'duplicate_rate': args.duplicate_rate}
+    write_catalog(args.kind, args.rows, args.output, chunk_size=args.chunk_size, seed=args.seed, **kwargs)
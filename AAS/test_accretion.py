@@ -0,0 +1,26 @@
+# Run with: python -m pytest AAS
+
+import os
+import numpy as np
+import pandas as pd
+from accretion import AccretionGrid, log_r_luminosity
+from photometry import FILTERS
+
+CALIBRATION = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'alcala_full_spec_sptype.csv')
+
+def test_r_luminosity_of_the_sun():
+    assert np.isclose(log_r_luminosity(5772.), 0.)
+    # Cooler and smaller stars are fainter in r
+    assert log_r_luminosity(3000., 0.3) < log_r_luminosity(4000., 0.3) < 0
+
+def test_grid_against_alcala_accretion_luminosities():
+    grid = AccretionGrid.build(CALIBRATION)
+    # At a fixed color, L_acc now depends on Teff
+    assert np.ptp(grid.log_L_acc[len(grid.colors)//2]) > 1
+    # H-alpha minus r of each calibration star from its H-alpha equivalent width (negative in emission)
+    df = pd.read_csv(CALIBRATION).drop_duplicates('Object').dropna(subset=['logLacc', 'EWHa', 'Teff'])
+    color = -2.5*np.log10(1 + np.maximum(-df['EWHa'], 0)/FILTERS['VST_Ha'].bandwidth_AA)
+    log_L, _ = grid.query(color, teff=df['Teff'])
+    assert np.isfinite(log_L).all()
+    assert np.corrcoef(log_L, df['logLacc'])[0, 1] > 0.7
+    assert abs(np.median(log_L - df['logLacc'])) < 0.5
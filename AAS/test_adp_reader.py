@@ -0,0 +1,22 @@
+# Run with: python -m pytest AAS
+
+import numpy as np
+import pytest
+from astropy.io import fits
+from adp_reader import read_columns, block_to_dataframe
+
+def test_vector_columns_are_expanded(tmp_path):
+    filename = str(tmp_path / 'ADP.test.fits')
+    ra = np.array([10., 11., 12.])
+    aper = np.arange(9, dtype='>f4').reshape(3, 3)
+    hdu = fits.BinTableHDU.from_columns([fits.Column(name='RA', format='D', array=ra),
+                                         fits.Column(name='APER', format='3E', array=aper)])
+    fits.HDUList([fits.PrimaryHDU(), hdu]).writeto(filename)
+    df = read_columns(filename, ['RA', 'APER'])
+    assert df.columns.tolist() == ['RA', 'APER_0', 'APER_1', 'APER_2']
+    assert df['APER_2'].tolist() == [2., 5., 8.]
+    assert df['APER_0'].dtype.isnative
+
+def test_image_columns_raise():
+    with pytest.raises(ValueError):
+        block_to_dataframe({'STAMP': np.zeros((2, 3, 3))})
@@ -0,0 +1,61 @@
+# Run with: python -m pytest AAS
+
+import numpy as np
+import pytest
+import pandas as pd
+import pyarrow as pa
+from catalog_loader import load_catalog, load_columns, import_csv, cuts_mask, max_error, not_null
+from synthetic_catalogs import write_catalog
+
+def test_not_null_cuts_on_string_and_bool_columns(tmp_path):
+    filename = tmp_path / 'catalog.csv'
+    filename.write_text('Region,flag,FHa\nLupus,true,1.0\n,false,2.0\nCha,,3.0\nOph,true,NaN\n')
+    df = pd.read_csv(filename, dtype={'flag': 'boolean'})
+    cuts = not_null(['Region', 'flag', 'FHa'])
+    loaded = load_catalog(str(filename), cuts=cuts)
+    assert loaded['Region'].tolist() == ['Lupus']
+    # Same rows as the pandas path used while streaming
+    assert loaded['Region'].tolist() == df[cuts_mask(df, cuts)]['Region'].tolist()
+
+def test_best_match_is_picked_before_cuts(tmp_path):
+    # Source 1's nearest counterpart fails the cut: the source is dropped, not matched further out
+    filename = tmp_path / 'xmatch.csv'
+    filename.write_text('SPICY,angDist,rmag,e_rmag\n1,0.1,15.0,0.5\n1,0.8,18.0,0.05\n2,0.2,16.0,0.02\n2,0.9,19.0,0.01\n')
+    for chunksize in (None, 1):
+        df = import_csv(str(filename), ['rmag'], 'SPICY', keep=[], how='best', chunksize=chunksize, cuts=max_error(['e_rmag'], 0.1))
+        assert df.index.astype(int).tolist() == [2]
+        assert df['rmag'].tolist() == [16.0]
+
+def test_sidecar_columns_are_memory_mapped(tmp_path):
+    # More rows than one default Feather record batch (64K), which would force to_numpy to copy
+    filename = tmp_path / 'catalog.csv'
+    n = 100000
+    pd.DataFrame({'ra': np.linspace(0, 360, n), 'FHa': np.arange(n, dtype=np.float64)}).to_csv(filename, index=False)
+    load_columns(str(filename))
+    before = pa.total_allocated_bytes()
+    columns = load_columns(str(filename), ['ra', 'FHa'])
+    # Views onto the mapped file: read-only, and nothing allocated from Arrow's memory pool
+    assert pa.total_allocated_bytes() == before
+    for arr in columns.values():
+        assert len(arr) == n
+        assert not arr.flags.writeable
+    assert columns['FHa'][-1] == n - 1
+
+def test_streaming_matches_loading(tmp_path):
+    filename = str(tmp_path / 'xmatch.csv')
+    write_catalog('xmatch_spicy_vphas', 5000, filename, chunk_size=2000)
+    columns = ['mag3_6', 'rmag', 'Hamag']
+    for how, weight_col in (('mean', None), ('best', None), ('weighted', 'mag3_6')):
+        loaded = import_csv(filename, columns, 'SPICY', keep=[], how=how, weight_col=weight_col, cuts=max_error(['e_rmag'], 0.1))
+        streamed = import_csv(filename, columns, 'SPICY', keep=[], how=how, weight_col=weight_col, cuts=max_error(['e_rmag'], 0.1), chunksize=700)
+        # Same sources, dtypes and values (up to float32 sums) either way
+        assert isinstance(streamed.index.dtype, pd.CategoricalDtype) and isinstance(loaded.index.dtype, pd.CategoricalDtype)
+        assert streamed.index.categories.dtype == loaded.index.categories.dtype
+        assert streamed.index.tolist() == loaded.index.tolist()
+        for col in columns:
+            assert streamed[col].dtype == loaded[col].dtype
+            assert np.allclose(streamed[col], loaded[col], rtol=1e-6, equal_nan=True)
+
+def test_weighted_needs_a_weight_column(tmp_path):
+    with pytest.raises(ValueError):
+        import_csv(str(tmp_path / 'missing.csv'), ['rmag'], 'SPICY', how='weighted')
@@ -0,0 +1,23 @@
+# Run with: python -m pytest AAS
+
+import os
+from pipeline import local_modules, stage_key, dependencies, load_pipeline, HERE
+
+def test_stage_key_follows_imported_modules(tmp_path):
+    (tmp_path / 'helper.py').write_text('import numpy as np\nfrom catalog_loader import import_csv\nSCALE = 1\n')
+    script = tmp_path / 'script.py'
+    script.write_text('import os\nfrom helper import SCALE\n')
+    modules = local_modules(str(script))
+    # The module next to the script, and the project module it imports in turn
+    assert str(tmp_path / 'helper.py') in modules
+    assert os.path.join(HERE, 'catalog_loader.py') in modules
+    assert os.path.join(HERE, 'run_report.py') in modules
+    stage = {'script': str(script), 'args': [], 'inputs': []}
+    state = {'stages': {}, 'files': {}}
+    key = stage_key(stage, state)
+    (tmp_path / 'helper.py').write_text('import numpy as np\nfrom catalog_loader import import_csv\nSCALE = 2\n')
+    assert stage_key(stage, state) != key
+
+def test_alcala_stages_are_connected():
+    stages, _ = load_pipeline(os.path.join(HERE, 'pipeline.json'))
+    assert dependencies(stages)['alcala_c2d_xmatch'] == ['alcala_queries']
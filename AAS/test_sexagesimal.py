@@ -0,0 +1,25 @@
+# Run with: python -m pytest AAS
+
+import os
+import sys
+import subprocess
+import numpy as np
+from astropy import units as u
+from astropy.table import Table
+from astropy.coordinates import SkyCoord
+from sexagesimal import add_degree_columns
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_root_scripts_find_sexagesimal(tmp_path):
+    # As vizier_xmatch_alcala.py and SPICY/vizier_xmatch_SPICY_VPHAS.py import it, from another directory
+    code = 'import sys; sys.path.insert(0, {!r}); import aas_path; from sexagesimal import add_degree_columns'.format(ROOT)
+    env = {k: v for k, v in os.environ.items() if k != 'PYTHONPATH'}
+    subprocess.run([sys.executable, '-c', code], cwd=str(tmp_path), env=env, check=True)
+
+def test_alcala_table_matches_skycoord():
+    tbl = Table.read(os.path.join(ROOT, 'alcala2017_halpha_ra_dec.csv'))
+    add_degree_columns(tbl, ra_col='RAJ2000', dec_col='DEJ2000', ra_name='ra', dec_name='dec')
+    coords = SkyCoord(tbl['RAJ2000'], tbl['DEJ2000'], unit=(u.hourangle, u.deg))
+    assert np.allclose(tbl['ra'], coords.ra.deg, rtol=0, atol=1e-9)
+    assert np.allclose(tbl['dec'], coords.dec.deg, rtol=0, atol=1e-9)
@@ -0,0 +1,36 @@
+# Run with: python -m pytest AAS
+
+import numpy as np
+from astropy import units as u
+from astropy.coordinates import SkyCoord
+from catalog_store import append_to_store
+from sharded_xmatch import match_store
+from synthetic_catalogs import generate
+
+def test_match_store_finds_every_pair_once(tmp_path):
+    store = str(tmp_path / 'store')
+    vphas = generate('vphas', 20000)
+    # Packed into a 0.5 degree patch, so that the store has few pixels and close pairs are common
+    rng = np.random.default_rng(0)
+    vphas['RAJ2000'] = 250. + rng.uniform(0, 0.5, len(vphas))
+    vphas['DEJ2000'] = -40. + rng.uniform(0, 0.5, len(vphas))
+    append_to_store(store, vphas, ra_col='RAJ2000', dec_col='DEJ2000')
+    # Sources of a small tile, near some of the store's, some just outside the tile edges
+    rng = np.random.default_rng(1)
+    near = vphas.sample(2000, random_state=1)
+    df1 = near[['sourceID']].rename(columns={'sourceID': 'ID'}).reset_index(drop=True)
+    df1['RAJ2000'] = near['RAJ2000'].to_numpy() + rng.uniform(-2, 2, len(near))/3600
+    df1['DEJ2000'] = near['DEJ2000'].to_numpy() + rng.uniform(-2, 2, len(near))/3600
+    tile = {'ra_min': df1['RAJ2000'].min(), 'ra_max': df1['RAJ2000'].max(), 'dec_min': df1['DEJ2000'].min(), 'dec_max': df1['DEJ2000'].max()}
+    result = match_store(df1, store, tile, 'RAJ2000', 'DEJ2000', max_distance=1.)
+    # XMatch.query layout: angDist first, _1/_2 suffixes on the shared position columns
+    assert result.columns[:4].tolist() == ['angDist', 'ID', 'RAJ2000_1', 'DEJ2000_1']
+    assert 'RAJ2000_2' in result.columns and 'sourceID' in result.columns
+    # Same pairs as a brute-force search over the whole catalog
+    c1 = SkyCoord(df1['RAJ2000'], df1['DEJ2000'], unit=u.deg)
+    c2 = SkyCoord(vphas['RAJ2000'], vphas['DEJ2000'], unit=u.deg)
+    i1, i2, sep, _ = c2.search_around_sky(c1, 1*u.arcsec)
+    expected = sorted(zip(df1['ID'].to_numpy()[i1], vphas['sourceID'].to_numpy()[i2]))
+    assert len(expected) > 100
+    assert sorted(zip(result['ID'], result['sourceID'])) == expected
+    assert np.allclose(np.sort(result['angDist']), np.sort(sep.arcsec), atol=1e-6)
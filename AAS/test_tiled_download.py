@@ -0,0 +1,66 @@
+# Run with: python -m pytest AAS
+
+import io
+import threading
+import urllib.parse
+from http.server import HTTPServer, BaseHTTPRequestHandler
+import numpy as np
+import pytest
+from astropy.table import Table
+from astropy.io.votable import from_table
+from tiled_download import download_region
+
+# The stand-in catalog: a grid of sources over the box downloaded below
+RA, DEC = (a.ravel() for a in np.meshgrid(np.arange(10.005, 10.3, 0.01), np.arange(-20.295, -20., 0.01)))
+SOURCE_ID = np.arange(len(RA))
+
+class StandInVizieR(BaseHTTPRequestHandler):
+    '''Answers box queries the way VizieR's votable service does, from the grid above.'''
+    requests = []
+
+    def do_GET(self):
+        params = dict(urllib.parse.parse_qsl(urllib.parse.urlparse(self.path).query, keep_blank_values=True))
+        StandInVizieR.requests.append(params)
+        ra, dec = (float(v) for v in params['-c'].split())
+        width, height = (float(v) for v in params['-c.bd'].split('x'))
+        inside = (np.abs(RA - ra)*np.cos(np.radians(DEC)) <= width/2) & (np.abs(DEC - dec) <= height/2)
+        tbl = Table({'sourceID': SOURCE_ID[inside], 'RAJ2000': RA[inside], 'DEJ2000': DEC[inside]})
+        out = io.BytesIO()
+        from_table(tbl).to_xml(out)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml')
+        self.end_headers()
+        self.wfile.write(out.getvalue())
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = HTTPServer(('127.0.0.1', 0), StandInVizieR)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    StandInVizieR.requests.clear()
+    yield 'http://127.0.0.1:{}/viz-bin/votable'.format(httpd.server_port)
+    httpd.shutdown()
+
+def test_download_resumes_and_refuses_other_parameters(tmp_path, server):
+    checkpoint_dir = str(tmp_path / 'tiles')
+    box = (10., 10.3, -20.3, -20.)
+    df = download_region(*box, checkpoint_dir, tile_size=0.1, max_workers=2, url=server, id_col='sourceID')
+    # Every source once, despite the padded, overlapping tile queries
+    assert sorted(df['sourceID']) == SOURCE_ID.tolist()
+    n_requests = len(StandInVizieR.requests)
+    assert n_requests > 1
+    # Resuming with the same parameters fetches nothing
+    again = download_region(*box, checkpoint_dir, tile_size=0.1, max_workers=2, url=server, id_col='sourceID')
+    assert len(StandInVizieR.requests) == n_requests
+    assert sorted(again['sourceID']) == SOURCE_ID.tolist()
+    # The same tile indices with another tile size, box or column selection would be other tiles
+    with pytest.raises(ValueError):
+        download_region(*box, checkpoint_dir, tile_size=0.05, url=server)
+    with pytest.raises(ValueError):
+        download_region(10., 10.2, -20.3, -20., checkpoint_dir, tile_size=0.1, url=server)
+    with pytest.raises(ValueError):
+        download_region(*box, checkpoint_dir, tile_size=0.1, url=server, columns=['sourceID', 'RAJ2000', 'DEJ2000'])
+    assert len(StandInVizieR.requests) == n_requests
@@ -0,0 +1,126 @@
+# Download a large sky region from VizieR (e.g. VPHAS, II/341/vphasp) as a set of small tiles.
+# Tiles are fetched by a bounded pool of workers and checkpointed to disk as they finish,
+# so an interrupted run picks up where it stopped. Every source is kept by exactly one tile
+# (the one whose half-open RA/dec box contains it), which removes duplicates on tile edges.
+# The download parameters are kept in a manifest next to the tiles, and resuming into a
+# checkpoint directory written with different ones (another box, tile size, catalog or
+# columns) is refused, since its tiles would not be the ones asked for.
+
+import os
+import io
+import json
+import time
+import urllib.parse
+import urllib.request
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from astropy.io.votable import parse_single_table
+from catalog_store import append_to_store
+
+VIZIER_URL = 'https://vizier.cds.unistra.fr/viz-bin/votable'
+
+def make_tiles(ra_min, ra_max, dec_min, dec_max, tile_size=0.5):
+    '''Split an RA/dec box (degrees) into tiles roughly tile_size degrees on a side.
+    RA steps are widened by 1/cos(dec) so that tiles cover similar areas of sky.'''
+    tiles = []
+    dec_edges = np.linspace(dec_min, dec_max, max(int(np.ceil((dec_max - dec_min)/tile_size)), 1) + 1)
+    for dec_lo, dec_hi in zip(dec_edges[:-1], dec_edges[1:]):
+        cos_dec = max(np.cos(np.radians(max(abs(dec_lo), abs(dec_hi)))), 1e-3)
+        n_ra = max(int(np.ceil((ra_max - ra_min)*cos_dec/tile_size)), 1)
+        ra_edges = np.linspace(ra_min, ra_max, n_ra + 1)
+        for ra_lo, ra_hi in zip(ra_edges[:-1], ra_edges[1:]):
+            tiles.append({'index': len(tiles), 'ra_min': ra_lo, 'ra_max': ra_hi, 'dec_min': dec_lo, 'dec_max': dec_hi})
+    return tiles
+
+def fetch_tile(tile, catalog='II/341/vphasp', columns=None, url=VIZIER_URL, pad=2./3600, timeout=300):
+    '''Query VizieR for a box slightly larger than the tile and return it as a dataframe.'''
+    ra_center = 0.5*(tile['ra_min'] + tile['ra_max'])
+    dec_center = 0.5*(tile['dec_min'] + tile['dec_max'])
+    # The box is widest on the edge nearest the equator
+    cos_dec = 1. if tile['dec_min']*tile['dec_max'] <= 0 else np.cos(np.radians(min(abs(tile['dec_min']), abs(tile['dec_max']))))
+    width = (tile['ra_max'] - tile['ra_min'])*cos_dec + 2*pad
+    height = tile['dec_max'] - tile['dec_min'] + 2*pad
+    params = {'-source': catalog,
+              '-c': '{:.6f} {:+.6f}'.format(ra_center, dec_center),
+              '-c.u': 'deg',
+              '-c.bd': '{:.6f}x{:.6f}'.format(width, height),
+              '-out.max': 'unlimited',
+              '-oc.form': 'd'}
+    if columns is None:
+        params['-out.all'] = ''
+    else:
+        params['-out'] = ','.join(columns)
+    with urllib.request.urlopen(url + '?' + urllib.parse.urlencode(params), timeout=timeout) as response:
+        data = response.read()
+    return parse_single_table(io.BytesIO(data)).to_table().to_pandas()
+
+def tile_filename(checkpoint_dir, tile):
+    '''Checkpoint file for a finished tile.'''
+    return os.path.join(checkpoint_dir, 'tile_{:05d}.parquet'.format(tile['index']))
+
+def manifest(ra_min, ra_max, dec_min, dec_max, tile_size, ra_col, dec_col, catalog=None, columns=None, pad=None, **fetch_kwargs):
+    '''The parameters that decide what the tiles of a download hold (None for the defaults of fetch_tile).'''
+    return {'box': [ra_min, ra_max, dec_min, dec_max], 'tile_size': tile_size, 'ra_col': ra_col, 'dec_col': dec_col,
+            'catalog': catalog, 'columns': None if columns is None else list(columns), 'pad': pad}
+
+def check_manifest(checkpoint_dir, params):
+    '''Write the manifest of a new checkpoint directory, or check that an existing one was
+    written with the same parameters. Raises ValueError if it was not.'''
+    filename = os.path.join(checkpoint_dir, 'manifest.json')
+    if os.path.exists(filename):
+        with open(filename) as f:
+            saved = json.load(f)
+        if saved != params:
+            raise ValueError("{} holds tiles of another download ({}, not {}); use another checkpoint directory "
+                             "or empty this one".format(checkpoint_dir, saved, params))
+        return
+    if any(name.startswith('tile_') for name in os.listdir(checkpoint_dir)):
+        raise ValueError("{} holds tiles but no manifest, so they cannot be checked against this download; "
+                         "use another checkpoint directory or empty this one".format(checkpoint_dir))
+    with open(filename + '.tmp', 'w') as f:
+        json.dump(params, f)
+    os.replace(filename + '.tmp', filename)
+
+def download_tile(tile, checkpoint_dir, ra_col='RAJ2000', dec_col='DEJ2000', retries=3, fetch=fetch_tile, **fetch_kwargs):
+    '''Fetch one tile, keep only the sources it owns, and checkpoint it to disk.'''
+    for attempt in range(retries):
+        try:
+            df = fetch(tile, **fetch_kwargs)
+            break
+        except Exception:
+            if attempt == retries - 1:
+                raise
+            time.sleep(2**attempt)
+    ra, dec = df[ra_col].values, df[dec_col].values
+    owned = (ra >= tile['ra_min']) & (ra < tile['ra_max']) & (dec >= tile['dec_min']) & (dec < tile['dec_max'])
+    df = df[owned].reset_index(drop=True)
+    # Write to a temporary file first, so a killed run never leaves a half-written checkpoint
+    filename = tile_filename(checkpoint_dir, tile)
+    df.to_parquet(filename + '.tmp', index=False)
+    os.replace(filename + '.tmp', filename)
+    return len(df)
+
+def download_region(ra_min, ra_max, dec_min, dec_max, checkpoint_dir, tile_size=0.5, max_workers=4,
+                    ra_col='RAJ2000', dec_col='DEJ2000', id_col=None, store_path=None, **fetch_kwargs):
+    '''Download an RA/dec box tile by tile and return the combined dataframe.
+    Tiles already in checkpoint_dir are not fetched again. Sources on the upper RA/dec edge
+    of the box belong to no tile; extend the box slightly if they are needed. If id_col is
+    given, any remaining duplicate IDs are dropped. If store_path is given, the result is
+    also added to the HEALPix catalog store at that path. Raises ValueError if checkpoint_dir
+    holds tiles of a download with other parameters (see check_manifest).'''
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    check_manifest(checkpoint_dir, manifest(ra_min, ra_max, dec_min, dec_max, tile_size, ra_col, dec_col, **fetch_kwargs))
+    tiles = make_tiles(ra_min, ra_max, dec_min, dec_max, tile_size=tile_size)
+    todo = [tile for tile in tiles if not os.path.exists(tile_filename(checkpoint_dir, tile))]
+    print("Downloading {} of {} tiles".format(len(todo), len(tiles)))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(download_tile, tile, checkpoint_dir, ra_col=ra_col, dec_col=dec_col, **fetch_kwargs) for tile in todo]
+        for future in as_completed(futures):
+            future.result()
+    df = pd.concat([pd.read_parquet(tile_filename(checkpoint_dir, tile)) for tile in tiles], ignore_index=True)
+    if id_col is not None:
+        df = df.drop_duplicates(subset=id_col).reset_index(drop=True)
+    if store_path is not None:
+        append_to_store(store_path, df, ra_col=ra_col, dec_col=dec_col)
+    return df
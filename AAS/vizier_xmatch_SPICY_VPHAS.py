@@ -1,20 +1,35 @@
 # Cross-match SPICY (Spitzer/IRAC) data on YSO candidates with VPHAS and/or IPHAS (H-alpha)
+# If the local VPHAS store has been built (see tiled_download.py and adhoc.py), the match is
+# done locally against it, tile by tile (see sharded_xmatch.py); otherwise it goes through
+# the xMatch service.
 
-from astroquery.xmatch import XMatch
+import os
+import shutil
+from query_cache import cached_xmatch
 from astropy import units as u
-from astropy import table, coordinates
+from astropy import table
+from sexagesimal import add_degree_columns
+from catalog_loader import load_columns
+from catalog_store import VPHAS_STORE
+from sharded_xmatch import plan_shards, run_local
 
 def read_table(filename, coord_convert_deg=False):
-    '''Read in table to be crossmatched as an astropy table.'''
+    '''Read in table to be crossmatched as an astropy table (a view onto its memory-mapped
+    columnar sidecar, see catalog_loader.py).'''
     print("Reading in table")
-    tbl = table.Table.read(filename)
+    tbl = table.Table(load_columns(filename), copy=False)
     if coord_convert_deg==True:
         print("Converting coordinates to decimal form")
-        tbl.add_column(name='ra', col=coordinates.SkyCoord(tbl['RAJ2000'], tbl['DEJ2000'], frame='fk5', unit=(u.h, u.deg)).ra)
-        tbl.add_column(name='dec', col=coordinates.SkyCoord(tbl['RAJ2000'], tbl['DEJ2000'], frame='fk5', unit=(u.h, u.deg)).dec)
+        add_degree_columns(tbl, ra_col='RAJ2000', dec_col='DEJ2000', ra_name='ra', dec_name='dec')
     print("Returning table")
     return tbl
 
-tbl = read_table('table1.csv', coord_convert_deg=False)
-result = XMatch.query(cat1=tbl, cat2='vizier:II/341/vphasp', max_distance=1*u.arcsec, colRA1='ra', colDec1='dec', colRA2='RAJ2000', colDec2='DEJ2000')
-result.write('xmatch_SPICY_VPHAS.csv')
\ No newline at end of file
+if os.path.isdir(VPHAS_STORE):
+    # Start from a clean plan, so shards of an earlier table1.csv are not reused
+    shutil.rmtree('xmatch_SPICY_VPHAS_shards', ignore_errors=True)
+    plan = plan_shards('table1.csv', VPHAS_STORE, 'xmatch_SPICY_VPHAS_shards', ra_col='ra', dec_col='dec', max_distance=1.)
+    run_local(plan, workers=4, output='xmatch_SPICY_VPHAS.csv')
+else:
+    tbl = read_table('table1.csv', coord_convert_deg=False)
+    result = cached_xmatch(cat1=tbl, cat2='vizier:II/341/vphasp', max_distance=1*u.arcsec, colRA1='ra', colDec1='dec', colRA2='RAJ2000', colDec2='DEJ2000')
+    result.write('xmatch_SPICY_VPHAS.csv', overwrite=True)
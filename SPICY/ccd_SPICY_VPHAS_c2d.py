@@ -3,32 +3,14 @@
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'AAS'))  # shared modules (see ../aas_path.py)
+from catalog_loader import import_csv
+from photometry import add_magnitudes
 
 plt.rcParams['text.latex.preamble'] = [r'\usepackage{gensymb}']
 
-def import_csv(filename, columns, sourceName, drop_NaN=True):
-    '''Import contents of a .csv file into a pandas dataframe, dropping NaNs
-    when specified and grouping by specified unique identifier.'''
-    df = pd.read_csv(filename)
-    if drop_NaN==True:
-        df = df.dropna(subset=columns)
-    df = df.groupby(sourceName).mean()
-    return df
-
-def convert_flux_to_mag(flux, filter):
-    '''Convert flux densities to magnitudes using correct zero points. 
-    From http://svo2.cab.inta-csic.es/theory/fps/index.php?mode=browse&gname=Spitzer'''
-    if filter=='FIR1':
-        FIR_ZP_Jy = 277.2
-    if filter=='FIR2':
-        FIR_ZP_Jy = 179.0
-    if filter=='FIR3':
-        FIR_ZP_Jy = 113.8
-    if filter=='FIR4':
-        FIR_ZP_Jy = 62.0     
-    mag = -2.5*np.log10(flux*(10**(-3))/FIR_ZP_Jy)
-    return mag
-
 def plot_ccd(df_yso, df_back):
     '''Plot a color-color diagram, given a dataframe.'''
     # Define variables
@@ -45,15 +27,12 @@ def plot_ccd(df_yso, df_back):
     plt.legend()
     plt.show()
 
-df_yso = import_csv('SPICY_VPHAS_xmatch.csv',columns=['mag3_6','mag4_5','mag5_8','mag8_0','Hamag'],sourceName='SPICY')
-df_background = import_csv('c2d_VPHAS_xmatch.csv',columns=['FIR1','FIR2','FIR3','FIR4','Hamag'],sourceName='sourceID')
+df_yso = import_csv('SPICY_VPHAS_xmatch.csv',columns=['mag3_6','mag4_5','mag5_8','mag8_0','Hamag'],sourceName='SPICY',keep=[],how='best')
+df_background = import_csv('c2d_VPHAS_xmatch.csv',columns=['FIR1','FIR2','FIR3','FIR4','Hamag'],sourceName='sourceID',keep=[],how='best')
 
 print(len(df_yso))
 print(len(df_background))
 
-df_background['FIR1_mag'] = convert_flux_to_mag(df_background['FIR1'], 'FIR1')
-df_background['FIR2_mag'] = convert_flux_to_mag(df_background['FIR2'], 'FIR2')
-df_background['FIR3_mag'] = convert_flux_to_mag(df_background['FIR3'], 'FIR3')
-df_background['FIR4_mag'] = convert_flux_to_mag(df_background['FIR4'], 'FIR4')
+df_background = add_magnitudes(df_background, ['FIR1','FIR2','FIR3','FIR4'])
 
 plot_ccd(df_yso, df_background)
@@ -1,20 +1,25 @@
 # Cross-match SPICY (Spitzer/IRAC) data on YSO candidates with VPHAS and/or IPHAS (H-alpha)
 
-from astroquery.xmatch import XMatch
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'AAS'))  # shared modules (see ../aas_path.py)
+from query_cache import cached_xmatch
 from astropy import units as u
-from astropy import table, coordinates
+from astropy import table
+from sexagesimal import add_degree_columns
+from catalog_loader import load_columns
 
 def read_table(filename, coord_convert_deg=False):
-    '''Read in table to be crossmatched as an astropy table.'''
+    '''Read in table to be crossmatched as an astropy table (a view onto its memory-mapped
+    columnar sidecar, see catalog_loader.py).'''
     print("Reading in table")
-    tbl = table.Table.read(filename)
+    tbl = table.Table(load_columns(filename), copy=False)
     if coord_convert_deg==True:
         print("Converting coordinates to decimal form")
-        tbl.add_column(name='ra', col=coordinates.SkyCoord(tbl['RAJ2000'], tbl['DEJ2000'], frame='fk5', unit=(u.h, u.deg)).ra)
-        tbl.add_column(name='dec', col=coordinates.SkyCoord(tbl['RAJ2000'], tbl['DEJ2000'], frame='fk5', unit=(u.h, u.deg)).dec)
+        add_degree_columns(tbl, ra_col='RAJ2000', dec_col='DEJ2000', ra_name='ra', dec_name='dec')
     print("Returning table")
     return tbl
 
 tbl = read_table('table1.csv', coord_convert_deg=False)
-result = XMatch.query(cat1=tbl, cat2='vizier:II/341/vphasp', max_distance=1*u.arcsec, colRA1='ra', colDec1='dec', colRA2='RAJ2000', colDec2='DEJ2000')
-result.write('SPICY_VPHAS_xmatch.csv')
\ No newline at end of file
+result = cached_xmatch(cat1=tbl, cat2='vizier:II/341/vphasp', max_distance=1*u.arcsec, colRA1='ra', colDec1='dec', colRA2='RAJ2000', colDec2='DEJ2000')
+result.write('SPICY_VPHAS_xmatch.csv', overwrite=True)
\ No newline at end of file
@@ -0,0 +1,11 @@
+# Puts the shared modules in AAS/ (catalog_loader, query_cache, sexagesimal, photometry, ...)
+# on the import path of the scripts kept outside it, so that they run from any directory:
+#     import aas_path  # before importing from AAS/
+# Scripts in subfolders (e.g. SPICY/) add ../AAS themselves, as this file is not on their path.
+
+import os
+import sys
+
+AAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'AAS')
+if AAS not in sys.path:
+    sys.path.insert(0, AAS)
@@ -2,20 +2,30 @@ import numpy as np
 from astropy.io import fits
 import matplotlib.pyplot as plt
 from astropy.table import Table
+import aas_path  # puts AAS/ on the import path
+from adp_reader import open_adp, catalog_hdus, iter_blocks, ingest_adp
+from catalog_store import VPHAS_STORE
 
 # Example fileame:
 # ADP.2020-02-12T10:26:23.730.fits
 
 filename = "/orange/adamginsburg/adhoc/ADP.2020-02-12T10:26:23.730.fits"
 
-hdul = fits.open(filename)
+# Memory-mapped, so only the headers are read here
+hdul = open_adp(filename)
 #hdul.info()
 #print(repr(hdul[0].header))
 
 #print(hdul[-1].columns)
-print(hdul[4].data)
+print(catalog_hdus(hdul))
+hdul.close()
 
-#catalog1 = Table.read("/orange/adamginsburg/adhoc/ADP.2020-02-12T10:26:23.730.fits")
+# Look at the first rows of extension 4 without reading the whole table
+for i, block in iter_blocks(filename, hdus=[4], block_size=10):
+    print(block)
+    break
 
-hdul.close()
+#catalog1 = Table.read("/orange/adamginsburg/adhoc/ADP.2020-02-12T10:26:23.730.fits")
 
+# Ingest every catalog extension into the local VPHAS store, a block of rows at a time
+#ingest_adp(filename, VPHAS_STORE, block_size=1000000)
@@ -6,44 +6,13 @@ import matplotlib.pyplot as plt
 from astropy import units as u
 import pylab as pl
 import matplotlib as mpl
+import aas_path  # puts AAS/ on the import path
 from adaptive_param_plot import *
+from catalog_loader import import_csv
+from photometry import add_magnitudes
 
 plt.rcParams['text.latex.preamble'] = [r'\usepackage{gensymb}']
 
-def import_csv(filename, columns, sourceName, drop_NaN=True):
-    '''Import contents of a .csv file into a pandas dataframe, dropping NaNs
-    when specified and grouping by specified unique identifier.'''
-    df = pd.read_csv(filename)
-    if drop_NaN==True:
-        df = df.dropna(subset=columns)
-    df = df.groupby(sourceName).mean()
-    return df
-
-def convert_flux_to_mag(flux, filter):
-    '''Convert H-alpha fluxes to average flux densities in mJy.'''
-    if filter=='FHa':
-        FHa_flux = u.Quantity(flux, (10**(-3))*u.W/u.meter**2) # Give flux units that match catalog units
-        frequency_Ha = (6568.0 * u.AA).to(u.Hz, equivalencies=u.spectral()) # Used INT WFC H-alpha filter center wavelength from http://svo2.cab.inta-csic.es/theory/fps/index.php?id=INT/IPHAS.Ha&&mode=browse&gname=INT&gname2=IPHAS#filter
-        FHa_Jy = (FHa_flux/frequency_Ha).to(u.Jy) # Divide H-alpha flux by frequency of H-alpha in Hz
-        print(FHa_Jy)
-        Ha_ZP_Jy = 2659.39*u.Jy # VST H-alpha filter from http://svo2.cab.inta-csic.es/theory/fps/index.php?id=Paranal/OmegaCAM.Halpha&&mode=search&search_instrument=OmegaCAM#filter
-        mag = -2.5*np.log10(FHa_Jy/Ha_ZP_Jy)
-    return mag
-
-def convert_flux_density_to_mag(flux_density, filter):
-    '''Convert flux densities to magnitudes using correct zero points. 
-    From http://svo2.cab.inta-csic.es/theory/fps/index.php?mode=browse&gname=Spitzer'''
-    if filter=='FIR1':
-        FIR_ZP_Jy = 277.2
-    if filter=='FIR2':
-        FIR_ZP_Jy = 179.0
-    if filter=='FIR3':
-        FIR_ZP_Jy = 113.8
-    if filter=='FIR4':
-        FIR_ZP_Jy = 62.0
-    mag = -2.5*np.log10(flux_density*(10**(-3))/FIR_ZP_Jy)
-    return mag
-
 def get_data(df, df_type):
     '''Get data from a given dataframe.'''
     if df_type=='ysoA':
@@ -78,19 +47,12 @@ def plot_contoured_ccd(yso_x, yso_y, bg_x, bg_y, x_lab, y_lab, bins):
     plt.legend()
     plt.show()
 
-# df_ysoA = import_csv('alcala_full_spec.csv',columns=['FIR1','FIR2','FIR3','FIR4','FHa'],sourceName='Object')
-df_yso = import_csv('SPICY_VPHAS_xmatch.csv',columns=['mag3_6','mag4_5','mag5_8','mag8_0','Hamag'],sourceName='SPICY')
-df_background = import_csv('c2d_VPHAS_xmatch.csv',columns=['FIR1','FIR2','FIR3','FIR4','Hamag'],sourceName='sourceID')
+# df_ysoA = import_csv('alcala_full_spec.csv',columns=['FIR1','FIR2','FIR3','FIR4','FHa'],sourceName='Object',keep=[])
+df_yso = import_csv('SPICY_VPHAS_xmatch.csv',columns=['mag3_6','mag4_5','mag5_8','mag8_0','Hamag'],sourceName='SPICY',keep=['rmag','r2mag'],how='best')
+df_background = import_csv('c2d_VPHAS_xmatch.csv',columns=['FIR1','FIR2','FIR3','FIR4','Hamag'],sourceName='sourceID',keep=['rmag','r2mag'],how='best')
 
-# df_ysoA['Hamag'] = convert_flux_to_mag(df_ysoA['FHa'], 'FHa')
-# df_ysoA['FIR1_mag'] = convert_flux_density_to_mag(df_ysoA['FIR1'], 'FIR1')
-# df_ysoA['FIR2_mag'] = convert_flux_density_to_mag(df_ysoA['FIR2'], 'FIR2')
-# df_ysoA['FIR3_mag'] = convert_flux_density_to_mag(df_ysoA['FIR3'], 'FIR3')
-# df_ysoA['FIR4_mag'] = convert_flux_density_to_mag(df_ysoA['FIR4'], 'FIR4')
-df_background['FIR1_mag'] = convert_flux_density_to_mag(df_background['FIR1'], 'FIR1')
-df_background['FIR2_mag'] = convert_flux_density_to_mag(df_background['FIR2'], 'FIR2')
-df_background['FIR3_mag'] = convert_flux_density_to_mag(df_background['FIR3'], 'FIR3')
-df_background['FIR4_mag'] = convert_flux_density_to_mag(df_background['FIR4'], 'FIR4')
+# df_ysoA = add_magnitudes(df_ysoA, ['FHa','FIR1','FIR2','FIR3','FIR4'])
+df_background = add_magnitudes(df_background, ['FIR1','FIR2','FIR3','FIR4'])
 
 # ysoA_3p6, ysoA_4p5, ysoA_5p8, ysoA_8p0, ysoA_Halpha, ysoA_rmag, ysoA_r2mag = get_data(df_ysoA, 'ysoA')
 yso_3p6, yso_4p5, yso_5p8, yso_8p0, yso_Halpha, yso_rmag, yso_r2mag = get_data(df_yso, 'yso')
@@ -2,9 +2,10 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib import rc
-import sys
 from astropy import units as u
-from astropy.coordinates import SkyCoord
+import aas_path  # puts AAS/ on the import path
+from photometry import FILTERS
+from galactic import radec_to_lb
 
 # Import the relevant .csv files, turn them into dataframes
 filepath_background = 'background_xmatch_test.csv'
@@ -18,17 +19,9 @@ df_background_dropped = df_background.dropna(subset=['FIR1','FIR2','FIR3','FIR4'
 #print("Number of rows in current background catalog:",len(df_background_dropped),"-- dropped",len(df_background)-len(df_background_dropped))
 
 #print(df_background_dropped)
-background_RA = u.Quantity(df_background_dropped['RAJ2000_1'].values, u.deg)
-background_DEC = u.Quantity(df_background_dropped['DEJ2000_1'].values, u.deg)
-#print(background_RA)
-#print(background_DEC)
-
-c = SkyCoord(background_RA, background_DEC, frame='icrs')
-#print(c)
-c_gal = c.galactic
-#print(c_gal)
-background_l = (c_gal.l).to(u.deg)
-background_b = (c_gal.b).to(u.deg)
+# Galactic coordinates from a fixed ICRS -> Galactic rotation (see galactic.py), rather than a full SkyCoord transform
+background_l, background_b = radec_to_lb(df_background_dropped['RAJ2000_1'].values, df_background_dropped['DEJ2000_1'].values)
+background_l, background_b = background_l*u.deg, background_b*u.deg
 #print(background_l)
 #print(background_b)
 
@@ -36,10 +29,10 @@ background_b = (c_gal.b).to(u.deg)
 
 # Try to determine whether we see H-alpha emitters in background stars
 background_r_mag = u.Quantity(df_background_dropped['rmag'].values, u.mag)
-background_r_ZP_Jy = 3086.72*u.Jy
+background_r_ZP_Jy = FILTERS['VST_r'].zero_point_Jy*u.Jy
 background_r_flux = background_r_ZP_Jy*10**(-background_r_mag/(2.5*u.mag))
 background_Ha_mag = u.Quantity(df_background_dropped['Hamag'].values, u.mag)
-Ha_ZP_Jy = 2659.4*u.Jy # INT WFC H-alpha filter from http://svo2.cab.inta-csic.es/theory/fps/index.php?id=INT/IPHAS.Ha&&mode=browse&gname=INT&gname2=IPHAS#filter
+Ha_ZP_Jy = FILTERS['VST_Ha'].zero_point_Jy*u.Jy # VPHAS magnitudes, so VST H-alpha filter
 background_Ha_flux = Ha_ZP_Jy*10**(-background_Ha_mag/(2.5*u.mag))
 background_Ha_contsub_flux = background_Ha_flux - background_r_flux
 background_Ha_contsub_mag = -2.5*np.log10(background_Ha_contsub_flux/Ha_ZP_Jy)*u.mag
@@ -1,20 +1,30 @@
-from astroquery.xmatch import XMatch
+import os
+import aas_path  # puts AAS/ on the import path
+from query_cache import cached_xmatch
 from astropy import units as u
-from astropy import table, coordinates
+from astropy import table
+from sexagesimal import add_degree_columns
+from catalog_store import VPHAS_STORE
+from sharded_xmatch import match_store
 
 # VizieR's xMatch service only accepts coordinates in degrees (this is true for browser version too). Need to convert.
 ## Read in table to be xMatch-ed as an astropy table:
 tbl = table.Table.read('alcala2017_halpha_ra_dec.csv')
-## Calculate and add new RA column in degrees: (written by Adam)
-tbl.add_column(name='ra', col=coordinates.SkyCoord(tbl['RAJ2000'], tbl['DEJ2000'], frame='fk5', unit=(u.h, u.deg)).ra)
-## Calculate and add new dec column in degrees: (written by Adam)
-tbl.add_column(name='dec', col=coordinates.SkyCoord(tbl['RAJ2000'], tbl['DEJ2000'], frame='fk5', unit=(u.h, u.deg)).dec)
-# Use new table to xMatch with VizieR catalog (here, c2d):
+## Calculate and add new RA and dec columns in degrees, parsed straight from the sexagesimal strings:
+add_degree_columns(tbl, ra_col='RAJ2000', dec_col='DEJ2000', ra_name='ra', dec_name='dec')
+# Use new table to xMatch with VPHAS: against the local VPHAS store if it has been built (see
+# catalog_store.py), reading only the store around the Lupus sources, otherwise through VizieR
 ## Make sure you specify what the names of the RA and dec columns are in each catalog.
-result = XMatch.query(cat1=tbl, cat2='vizier:II/341/vphasp', max_distance=1 * u.arcsec, colRA1='ra', colDec1='dec', colRA2='RAJ2000', colDec2='DEJ2000')
+if os.path.isdir(VPHAS_STORE):
+    df = tbl.to_pandas()
+    # One box around every source (Lupus does not straddle RA = 0)
+    box = {'ra_min': df['ra'].min(), 'ra_max': df['ra'].max(), 'dec_min': df['dec'].min(), 'dec_max': df['dec'].max()}
+    result = match_store(df, VPHAS_STORE, box, 'ra', 'dec', max_distance=1.)
+    result.to_csv('sanity_check.csv', index=False)
+else:
+    result = cached_xmatch(cat1=tbl, cat2='vizier:II/341/vphasp', max_distance=1 * u.arcsec, colRA1='ra', colDec1='dec', colRA2='RAJ2000', colDec2='DEJ2000')
+    # Write result to a .csv file (can also use a VOTable file):
+    result.write('sanity_check.csv', overwrite=True)
 
 #type(result)
 #print(result)
-
-# Write result to a .csv file (can also use a VOTable file):
-result.write('sanity_check.csv')
@@ -1,6 +1,9 @@
 from astroquery.vizier import Vizier
 import astropy.units as u
 import astropy.coordinates as coord
+import numpy as np
+import aas_path  # puts AAS/ on the import path
+from tiled_download import download_region
 
 Vizier.ROW_LIMIT = -1
 
@@ -8,7 +11,10 @@ Vizier.ROW_LIMIT = -1
 #print(catalogs)
 
 # Query VPHAS in a large area in c2d fields
-result = Vizier.query_region(coordinates = coord.SkyCoord(ra=235, dec=-34, unit=(u.deg, u.deg), frame='icrs'), width="30m", catalog="II/341/vphasp")[0]
+#result = Vizier.query_region(coordinates = coord.SkyCoord(ra=235, dec=-34, unit=(u.deg, u.deg), frame='icrs'), width="30m", catalog="II/341/vphasp")[0]
+## Same 30 arcmin box, fetched in tiles that are checkpointed to vphas_tiles/ (re-running resumes an interrupted download)
+half_width_ra = 0.25/np.cos(np.radians(34))
+result = download_region(235-half_width_ra, 235+half_width_ra, -34.25, -33.75, 'vphas_tiles', tile_size=0.1, max_workers=4, catalog="II/341/vphasp", id_col='sourceID')
 
 print(result)
-#result.write('vphas_test.csv")
+#result.to_csv('vphas_test.csv', index=False)
@@ -1,20 +1,20 @@
-from astroquery.xmatch import XMatch
+import aas_path  # puts AAS/ on the import path
+from query_cache import cached_xmatch
 from astropy import units as u
-from astropy import table, coordinates
+from astropy import table
+from sexagesimal import add_degree_columns
 
 # VizieR's xMatch service only accepts coordinates in degrees (this is true for browser version too). Need to convert.
 ## Read in table to be xMatch-ed as an astropy table:
 tbl = table.Table.read('alcala2017_halpha_ra_dec.csv')
-## Calculate and add new RA column in degrees: (written by Adam)
-tbl.add_column(name='ra', col=coordinates.SkyCoord(tbl['RAJ2000'], tbl['DEJ2000'], frame='fk5', unit=(u.h, u.deg)).ra)
-## Calculate and add new dec column in degrees: (written by Adam)
-tbl.add_column(name='dec', col=coordinates.SkyCoord(tbl['RAJ2000'], tbl['DEJ2000'], frame='fk5', unit=(u.h, u.deg)).dec)
+## Calculate and add new RA and dec columns in degrees, parsed straight from the sexagesimal strings:
+add_degree_columns(tbl, ra_col='RAJ2000', dec_col='DEJ2000', ra_name='ra', dec_name='dec')
 # Use new table to xMatch with VizieR catalog (here, c2d):
 ## Make sure you specify what the names of the RA and dec columns are in each catalog.
-result = XMatch.query(cat1=tbl, cat2='vizier:II/332/c2d', max_distance=1 * u.arcsec, colRA1='ra', colDec1='dec', colRA2='RAJ2000', colDec2='DEJ2000')
+result = cached_xmatch(cat1=tbl, cat2='vizier:II/332/c2d', max_distance=1 * u.arcsec, colRA1='ra', colDec1='dec', colRA2='RAJ2000', colDec2='DEJ2000')
 
 #type(result)
 #print(result)
 
 # Write result to a .csv file (can also use a VOTable file):
-result.write('alcala_full_spec.csv')
+result.write('alcala_full_spec.csv', overwrite=True)